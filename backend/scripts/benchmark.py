@@ -0,0 +1,201 @@
+# benchmark.py
+# Times the ingest -> score -> persist path on synthetic scenario captures and the API endpoints
+# in-process; results are JSON so runs can be diffed (--compare). Run from the backend dir:
+#   python scripts/benchmark.py --sizes 1e4,1e5,1e6 --output bench.json
+#   python scripts/benchmark.py --api --requests 2000 --concurrency 8
+import argparse, json, os, platform, shutil, subprocess, sys, tempfile, threading, time, warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.telemetry.generator import save_to_bin, read_bin, PACKET_SIZE
+from src.telemetry.scenarios import write_scenario
+from src.ai.battery_residual import LR_WINDOW, residuals as lr_residuals, residual_flags
+from src.pipeline.output_store import CsvSink
+from src.pipeline.process_pipeline import FEATURES, rule_checks, apply_flags, load_detector, run_pipeline
+
+MAX_IN_MEMORY = 10_000_000   # above this only the streaming pipeline is timed
+API_ENDPOINTS = ["/telemetry", "/stats", "/stats/aggregates", "/satellites"]
+
+def make_capture(path, n, seed=0):
+    # n seeded scenario packets written straight to the packet file
+    return write_scenario(path, n, seed=seed, start_ts=1_700_000_000)
+
+def rss_bytes():
+    # current resident set size (Linux); tracemalloc would slow pandas I/O several-fold
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+class PeakRss:
+    # samples RSS on a background thread; peak is measured relative to the start
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def _sample(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+def timed(name, n, fn, results, **extra):
+    # wall time, throughput and peak RSS growth of one call
+    with PeakRss() as mem:
+        t0 = time.perf_counter()
+        out = fn()
+        secs = time.perf_counter() - t0
+    peak = mem.peak - mem.start
+    results.append({"stage": name, "rows": n, "seconds": round(secs, 4),
+                    "rows_per_sec": round(n / secs) if secs > 0 else None,
+                    "mb_per_sec": round(n*PACKET_SIZE / 2**20 / secs, 1) if secs > 0 else None,
+                    "peak_mb": round(peak / 2**20, 1), **extra})
+    print(f"  {name:<22} {secs:9.3f}s  {n/secs if secs else 0:12,.0f} rows/s  peak +{peak/2**20:8.1f} MB")
+    return out
+
+def bench_size(n, workdir, model_dir, chunk_size, workers):
+    # everything is written to a private subdirectory of workdir, removed afterwards
+    run_dir = tempfile.mkdtemp(prefix=f"bench-{n}-", dir=workdir)
+    try:
+        return _bench_size(n, run_dir, model_dir, chunk_size, workers)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+def _bench_size(n, workdir, model_dir, chunk_size, workers):
+    results = []
+    capture = os.path.join(workdir, f"capture_{n}.bin")
+    print(f"[{n:,} packets]")
+    timed("generate", n, lambda: make_capture(capture, n), results)
+    if n <= MAX_IN_MEMORY:
+        detector = load_detector(model_dir)
+        df = timed("read_bin", n, lambda: read_bin(capture), results)
+        timed("save_to_bin", n, lambda: save_to_bin(df, os.path.join(workdir, "copy.bin")), results)
+        X = df[FEATURES].fillna(0.0).values
+        if detector.iso is not None and detector.scaler is not None:
+            timed("predict_iso", n, lambda: detector.predict_iso(X), results)
+        batt = df["battery_v"].ffill().values
+        if detector.lr is not None and len(batt) > LR_WINDOW + 1:
+            timed("lr_residual", n, lambda: residual_flags(lr_residuals(batt, detector.lr, len(batt)-LR_WINDOW-1)), results)
+        timed("rule_checks", n, lambda: rule_checks(df), results)
+        apply_flags(df, detector, np.zeros(len(df), dtype=int))
+        def write_csv():
+            sink = CsvSink(os.path.join(workdir, "out.csv"))
+            sink.write(df)
+            sink.close()
+        timed("csv_write", n, write_csv, results)
+        del df, X, batt
+        timed("run_pipeline", n, lambda: run_pipeline(capture, os.path.join(workdir, "processed.csv"), model_dir,
+                                                      workers=workers), results)
+    timed("run_pipeline_chunked", n, lambda: run_pipeline(capture, os.path.join(workdir, "processed.csv"), model_dir,
+                                                          chunk_size=chunk_size, workers=workers),
+          results, chunk_size=chunk_size)
+    return results
+
+def bench_api(n_requests, concurrency, endpoints=API_ENDPOINTS):
+    # in-process load test: the app (simulator, fleet, scorer threads) runs inside this
+    # process behind FastAPI's TestClient, so no sockets or external server are needed
+    from fastapi.testclient import TestClient
+    from src.api.server import app
+    results = []
+    with TestClient(app) as client:
+        time.sleep(1.0)   # let the simulator produce a few points
+        for path in endpoints:
+            def call(_):
+                t0 = time.perf_counter()
+                status = client.get(path).status_code
+                return time.perf_counter() - t0, status
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                calls = list(pool.map(call, range(n_requests)))
+            secs = time.perf_counter() - t0
+            lat = np.array([c[0] for c in calls]) * 1000
+            errors = sum(1 for c in calls if c[1] >= 400)
+            results.append({"stage": f"GET {path}", "requests": n_requests, "concurrency": concurrency,
+                            "seconds": round(secs, 4), "requests_per_sec": round(n_requests / secs, 1),
+                            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                            "p95_ms": round(float(np.percentile(lat, 95)), 3),
+                            "p99_ms": round(float(np.percentile(lat, 99)), 3), "errors": errors})
+            print(f"  GET {path:<20} {n_requests/secs:9.1f} req/s  p50 {np.percentile(lat, 50):7.2f} ms"
+                  f"  p99 {np.percentile(lat, 99):7.2f} ms  errors {errors}")
+    return results
+
+def environment():
+    import pandas, sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit or None,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pandas.__version__,
+            "sklearn": sklearn.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+def compare(results, baseline_path, tolerance):
+    # stages (matched on stage + rows/requests) that got slower than baseline * (1 + tolerance)
+    with open(baseline_path) as f:
+        baseline = {(r["stage"], r.get("rows", r.get("requests"))): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["stage"], r.get("rows", r.get("requests"))))
+        if old and old["seconds"] > 0 and r["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append({"stage": r["stage"], "rows": r.get("rows", r.get("requests")),
+                                "baseline_seconds": old["seconds"], "seconds": r["seconds"],
+                                "slowdown": round(r["seconds"] / old["seconds"], 2)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1e4,1e5,1e6", help="comma-separated capture sizes, e.g. 1e4,1e6,1e8")
+    parser.add_argument("--model_dir", default="model")
+    parser.add_argument("--chunk_size", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--workdir", default=None, help="where captures are written (default: a temp dir)")
+    parser.add_argument("--api", action="store_true", help="load-test the API endpoints instead")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default=None, help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", category=UserWarning)   # sklearn version pickle warnings
+
+    if args.api:
+        results = bench_api(args.requests, args.concurrency)
+    else:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="telemetry-bench-")
+        os.makedirs(workdir, exist_ok=True)
+        results = []
+        try:
+            for n in [int(float(s)) for s in args.sizes.split(",")]:
+                results += bench_size(n, workdir, args.model_dir, args.chunk_size, args.workers)
+        finally:
+            if not args.workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"environment": environment(), "results": results}
+    if args.compare:
+        report["regressions"] = compare(results, args.compare, args.tolerance)
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['stage']} ({r['rows']}): {r['baseline_seconds']}s -> {r['seconds']}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Results written to", args.output)
+    else:
+        print(json.dumps(report, indent=2))
+    if report.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,214 @@
 # train_models.py
 # Put this file at src/scripts/train_models.py and run with Python in project root.
-import os, joblib
+import argparse, json, os, sys, time, tracemalloc, joblib
+from contextlib import contextmanager
 import numpy as np, pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import IsolationForest
 from sklearn.linear_model import LinearRegression
-import struct
+
+# Add project root to sys.path so the shared telemetry reader can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.telemetry.generator import read_bin, read_packets, PACKET_SIZE
+from src.ai.battery_residual import LR_WINDOW, training_windows, battery_windows
+from src.ai.model_registry import ModelRegistry, MODEL_FILES, FEATURES
 
 # paths
 DATA_BIN = "data/telemetry.bin"
 MODEL_DIR = "model"
-os.makedirs(MODEL_DIR, exist_ok=True)
-
-# packet format used in repo
-PACKET_FMT = ">I f f f B B H 4f 8f"
-PACKET_SIZE = struct.calcsize(PACKET_FMT)
-FIELD_NAMES = ["ts","battery_v","solar_i","temp","cpu","comm","flags",
-               "qx","qy","qz","qw"] + [f"extra{i}" for i in range(8)]
-
-def read_bin(path=DATA_BIN):
-    rows=[]
-    with open(path,"rb") as f:
-        while True:
-            chunk = f.read(PACKET_SIZE)
-            if not chunk or len(chunk)<PACKET_SIZE:
-                break
-            vals = struct.unpack(PACKET_FMT, chunk)
-            rows.append(dict(zip(FIELD_NAMES, vals)))
-    return pd.DataFrame(rows)
-
-print("Reading telemetry from", DATA_BIN)
-df = read_bin(DATA_BIN)
-if df.empty:
-    raise SystemExit("No telemetry found; run generator first (scripts/generate_and_save.py)")
-
-# features for IsolationForest
-features = ["battery_v","solar_i","temp","cpu"] + [f"extra{i}" for i in range(8)]
-X = df[features].fillna(0.0).values
-
-# isolate normal subset (assume majority normal) - here take first 70% as "train"
-n = int(0.7 * len(X))
-X_train = X[:n]
-
-scaler = StandardScaler()
-X_train_s = scaler.fit_transform(X_train)
-
-print("Training IsolationForest...")
-iso = IsolationForest(n_estimators=200, contamination=0.03, random_state=42)
-iso.fit(X_train_s)
-
-# Save scaler and iso model
-joblib.dump(scaler, os.path.join(MODEL_DIR,"scaler.joblib"))
-joblib.dump(iso, os.path.join(MODEL_DIR,"isoforest.joblib"))
-print("Saved IsolationForest and scaler to", MODEL_DIR)
-
-# Train Linear Regression for battery prediction (window method)
-win = 5
-batt = df["battery_v"].fillna(method="ffill").values
-Xw, yw = [], []
-for i in range(len(batt)-win-1):
-    Xw.append(batt[i:i+win])
-    yw.append(batt[i+win])
-Xw = np.array(Xw); yw = np.array(yw)
-split = int(0.7 * len(Xw))
-Xb_train, yb_train = Xw[:split], yw[:split]
-
-print("Training LinearRegression for battery...")
-lr = LinearRegression()
-lr.fit(Xb_train, yb_train)
-joblib.dump(lr, os.path.join(MODEL_DIR,"lr_battery.joblib"))
-print("Saved LR model to", MODEL_DIR)
-
-print("All models trained and saved. You can now run the pipeline.")
+TRAIN_FRACTION = 0.7   # leading share of the capture treated as "normal" training data
+
+def peak_rss_mb():
+    # process peak resident set size so far, which includes sklearn / NumPy C
+    # allocations that tracemalloc does not see; None when the platform has no counter
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10   # bytes on macOS, KiB elsewhere
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20   # Windows
+    except (ImportError, AttributeError):
+        return None
+
+@contextmanager
+def stage(name, report):
+    # wall time and process peak RSS after one training stage, plus its peak traced
+    # (Python + NumPy) allocation while tracemalloc runs (--report only: tracing slows
+    # every allocation down)
+    traced = tracemalloc.is_tracing()
+    if traced:
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    yield
+    secs = time.perf_counter() - t0
+    row = {"stage": name, "seconds": round(secs, 3)}
+    line = f"  {name}: {secs:.2f}s"
+    rss = peak_rss_mb()
+    if rss is not None:
+        row["peak_rss_mb"] = round(rss, 1)
+        line += f", peak RSS {rss:.1f} MB"
+    if traced:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        row["peak_mb"] = round(peak_mb, 1)
+        line += f", peak traced {peak_mb:.1f} MB"
+    report.append(row)
+    print(line)
+
+def make_forest(n_jobs):
+    return IsolationForest(n_estimators=200, contamination=0.03, random_state=42, n_jobs=n_jobs)
+
+def lr_from_normal_equations(xtx, xty, win=LR_WINDOW):
+    # solve the accumulated [X 1]^T [X 1] w = [X 1]^T y for coef_ and intercept_;
+    # lstsq keeps a (near-)constant battery series from blowing up the solve
+    w = np.linalg.lstsq(xtx, xty, rcond=None)[0]
+    lr = LinearRegression()
+    lr.coef_, lr.intercept_ = w[:win], float(w[win])
+    lr.n_features_in_ = win
+    lr.rank_, lr.singular_ = np.linalg.matrix_rank(xtx[:win, :win]), np.empty(0)
+    return lr
+
+def train_in_memory(data_bin, n_jobs, report):
+    with stage("read", report):
+        df = read_bin(data_bin)
+        if df.empty:
+            raise SystemExit("No telemetry found; run generator first (scripts/generate_and_save.py)")
+        X = df[FEATURES].fillna(0.0).values
+        # isolate normal subset (assume majority normal) - here take first 70% as "train"
+        X_train = X[:int(TRAIN_FRACTION * len(X))]
+        if len(X_train) == 0:
+            raise SystemExit(f"Too little telemetry to train on ({len(X)} packets)")
+
+    with stage("scaler", report):
+        scaler = StandardScaler()
+        X_train_s = scaler.fit_transform(X_train)
+
+    print("Training IsolationForest...")
+    with stage("isoforest", report):
+        iso = make_forest(n_jobs).fit(X_train_s)
+
+    # Train Linear Regression for battery prediction (window method)
+    print("Training LinearRegression for battery...")
+    with stage("lr", report):
+        batt = df["battery_v"].ffill().values
+        Xw, yw = training_windows(batt, LR_WINDOW)
+        split = int(TRAIN_FRACTION * len(Xw))
+        lr = LinearRegression(n_jobs=n_jobs).fit(Xw[:split], yw[:split])
+    return scaler, iso, lr
+
+def train_streaming(data_bin, chunk_size, sample_size, n_jobs, report, seed=42):
+    # one pass over fixed-size packet chunks of the training region:
+    #  - scaler moments via partial_fit
+    #  - a uniform reservoir sample (algorithm R) of at most sample_size rows for the
+    #    forest, which only looks at 256 rows per tree anyway
+    #  - X^T X / X^T y of the battery windows, so the LR never needs the windows at once
+    # windows and the 70% splits are the same as in train_in_memory
+    win = LR_WINDOW
+    n_total = os.path.getsize(data_bin) // PACKET_SIZE
+    if n_total == 0:
+        raise SystemExit("No telemetry found; run generator first (scripts/generate_and_save.py)")
+    n_train = int(TRAIN_FRACTION * n_total)
+    if n_train == 0 or sample_size < 1:
+        # the forest would be fitted on an empty reservoir
+        raise SystemExit(f"Too little telemetry to train on ({n_total} packets, sample_size {sample_size})")
+    n_windows = int(TRAIN_FRACTION * max(0, n_total - win - 1))
+    n_read = max(n_train, n_windows + win)   # last row any training window touches
+
+    rng = np.random.default_rng(seed)
+    scaler = StandardScaler()
+    reservoir = np.empty((min(sample_size, n_train), len(FEATURES)))
+    xtx = np.zeros((win + 1, win + 1))
+    xty = np.zeros(win + 1)
+    tail = np.empty(0)
+
+    print("Streaming training data...")
+    with stage("stream", report):
+        for start in range(0, n_read, chunk_size):
+            packets = read_packets(data_bin, offset=start*PACKET_SIZE, count=min(chunk_size, n_read - start))
+            # features of rows inside the training region
+            X = np.column_stack([packets[f].astype(np.float64) for f in FEATURES])[:max(0, n_train - start)]
+            X = np.nan_to_num(X, nan=0.0)
+            if len(X):
+                scaler.partial_fit(X)
+                idx = start + np.arange(len(X))
+                fill = idx < len(reservoir)
+                reservoir[idx[fill]] = X[fill]
+                slot = rng.integers(0, idx[~fill] + 1)
+                keep = slot < len(reservoir)
+                slot, rows = slot[keep], X[~fill][keep]
+                # later rows win when they draw the same slot, as in the sequential algorithm
+                last = len(slot) - 1 - np.unique(slot[::-1], return_index=True)[1]
+                reservoir[slot[last]] = rows[last]
+
+            # battery windows, carrying the previous chunk's last `win` values (forward-filled)
+            batt = np.concatenate([tail, packets["battery_v"].astype(np.float64)])
+            batt = pd.Series(batt).ffill().values
+            g0 = start - len(tail)
+            n = min(len(batt) - win, n_windows - g0)
+            if n > 0:
+                A = np.empty((n, win + 1))
+                A[:, :win] = battery_windows(batt, win)[:n]
+                A[:, win] = 1.0
+                xtx += A.T @ A
+                xty += A.T @ batt[win:win + n]
+            tail = batt[-win:]
+
+    print("Training IsolationForest...")
+    with stage("isoforest", report):
+        iso = make_forest(n_jobs).fit(scaler.transform(reservoir))
+
+    print("Training LinearRegression for battery...")
+    with stage("lr", report):
+        lr = lr_from_normal_equations(xtx, xty, win)
+    return scaler, iso, lr
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=DATA_BIN)
+    parser.add_argument("--model_dir", default=MODEL_DIR)
+    parser.add_argument("--streaming", action="store_true", help="train from packet chunks in bounded memory")
+    parser.add_argument("--chunk_size", type=int, default=1_000_000)
+    parser.add_argument("--sample_size", type=int, default=1_000_000, help="max rows kept for the forest (streaming)")
+    parser.add_argument("--n_jobs", type=int, default=None, help="parallel jobs for fitting (-1 = all cores)")
+    parser.add_argument("--report", default=None, help="write per-stage time/memory as JSON (also traces Python allocations)")
+    args = parser.parse_args()
+    os.makedirs(args.model_dir, exist_ok=True)
+
+    print("Reading telemetry from", args.input)
+    report = []
+    if args.report:
+        tracemalloc.start()
+    if args.streaming:
+        scaler, iso, lr = train_streaming(args.input, args.chunk_size, args.sample_size, args.n_jobs, report)
+    else:
+        scaler, iso, lr = train_in_memory(args.input, args.n_jobs, report)
+    if args.report:
+        tracemalloc.stop()
+
+    # Save scaler, iso and LR models
+    joblib.dump(scaler, os.path.join(args.model_dir,"scaler.joblib"))
+    joblib.dump(iso, os.path.join(args.model_dir,"isoforest.joblib"))
+    joblib.dump(lr, os.path.join(args.model_dir,"lr_battery.joblib"))
+    print("Saved IsolationForest, scaler and LR model to", args.model_dir)
+
+    # Register the new models as a version; a running server picks it up from the manifest
+    version = ModelRegistry(args.model_dir).register(
+        {key: os.path.join(args.model_dir, name) for key, name in MODEL_FILES.items()}, features=FEATURES)
+    print("Registered model version", version)
+
+    total = "Total: {:.2f}s".format(sum(r["seconds"] for r in report))
+    if "peak_rss_mb" in report[-1]:
+        total += ", peak RSS {:.1f} MB".format(report[-1]["peak_rss_mb"])
+    if args.report:
+        total += ", peak traced {:.1f} MB".format(max(r["peak_mb"] for r in report))
+    print(total)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"version": version, "streaming": args.streaming, "stages": report}, f, indent=2)
+    print("All models trained and saved. You can now run the pipeline.")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,95 @@
-
-import joblib
+import os, threading
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from src.ai.compiled_forest import CompiledForest, sources_sha256
+
+# batches up to this size go through the compiled forest (far lower per-call latency);
+# larger ones through sklearn, whose per-tree C loop has the higher throughput.
+# Both give bit-identical scores.
+COMPILED_MAX_BATCH = 2048
+
+def compiled_cache_path(model_path):
+    # model/isoforest.joblib -> model/isoforest_compiled.npz (the compiled_forest CLI default)
+    return os.path.splitext(model_path)[0] + "_compiled.npz"
 
 class AnomalyDetector:
-    def __init__(self, model_path=None, scaler_path=None, lr_path=None):
-        self.iso = joblib.load(model_path) if model_path else None
-        self.scaler = joblib.load(scaler_path) if scaler_path else None
-        self.lr = joblib.load(lr_path) if lr_path else None
+    # The joblib models (and with them sklearn) load on first use when lazy=True. The
+    # compiled forest is cached as an .npz next to the forest file, so a process that
+    # only scores small batches (the API server) never has to import sklearn.
+    def __init__(self, model_path=None, scaler_path=None, lr_path=None, compiled=True, mmap_mode=None, lazy=False):
+        self.paths = (model_path, scaler_path, lr_path)
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._lock = threading.Lock()
+        self.compiled = None
+        if compiled and model_path:
+            try:
+                self.compiled = self._load_compiled()
+            except Exception as e:
+                print(f"Could not compile IsolationForest, using sklearn: {e}")
+        if not lazy:
+            for i in range(len(self.paths)):
+                self._model(i)
+
+    def _model(self, i):
+        path = self.paths[i]
+        if path is None:
+            return None
+        with self._lock:
+            if i not in self._models:
+                import joblib
+                self._models[i] = joblib.load(path, mmap_mode=self.mmap_mode)
+            return self._models[i]
+
+    @property
+    def iso(self):
+        return self._model(0)
+
+    @property
+    def scaler(self):
+        return self._model(1)
+
+    @property
+    def lr(self):
+        return self._model(2)
+
+    @property
+    def has_iso(self):
+        # forest and scaler configured, without loading them
+        return self.paths[0] is not None and self.paths[1] is not None
+
+    def _load_compiled(self):
+        # cached compile when it was built from the current forest and scaler files (by
+        # sha256, so a copy with preserved mtimes cannot pass off a stale cache), else
+        # compile from sklearn and refresh the cache (best effort, e.g. on a read-only model dir)
+        cache = compiled_cache_path(self.paths[0])
+        sources = sources_sha256(self.paths[:2])
+        if os.path.exists(cache):
+            compiled = CompiledForest.load(cache)
+            if compiled.sources == sources:
+                return compiled
+        compiled = CompiledForest.from_sklearn(self.iso, self.scaler)
+        compiled.sources = sources
+        try:
+            tmp = cache + ".tmp.npz"
+            compiled.save(tmp)
+            os.replace(tmp, cache)
+        except OSError:
+            pass
+        return compiled
 
     def predict_iso(self, X):
         # X: 2D numpy array of features (same order used in training)
+        if self.compiled is not None and len(X) <= COMPILED_MAX_BATCH:
+            return self.compiled.predict_iso(X)
         if self.scaler is not None:
             Xs = self.scaler.transform(X)
         else:
             Xs = X
-        pred = self.iso.predict(Xs)  # 1 normal, -1 anomaly
-        scores = -self.iso.decision_function(Xs)  # higher = more anomalous
-        return (pred == -1).astype(int), scores
+        # one forest pass: iso.predict() is just decision_function(Xs) < 0
+        decision = self.iso.decision_function(Xs)
+        scores = -decision  # higher = more anomalous
+        return (decision < 0).astype(int), scores
 
     def predict_lr_residual(self, windows):
         # windows: array of shape (n, window_size) for battery windows
@@ -25,3 +98,38 @@ class AnomalyDetector:
         preds = self.lr.predict(windows)
         return preds
 
+# per-process detector, loaded once by the pool initializer
+_worker_detector = None
+
+def _init_worker(paths):
+    global _worker_detector
+    _worker_detector = AnomalyDetector(*paths)
+
+def _score_shard(X):
+    return _worker_detector.predict_iso(X)
+
+class ParallelScorer:
+    # process pool with the models loaded once per worker; predict_iso() splits X into
+    # row shards, scores them concurrently and merges the results back in order
+    def __init__(self, detector, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(detector.paths,))
+
+    def predict_iso(self, X):
+        shards = [s for s in np.array_split(X, self.workers) if len(s)]
+        if not shards:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        results = list(self.pool.map(_score_shard, shards))
+        flags = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        return flags, scores
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,68 @@
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# battery LR predicts the next sample from the previous LR_WINDOW samples
+LR_WINDOW = 5
+THRESHOLD_METHODS = ("global", "rolling", "robust")
+
+def battery_windows(batt, win=LR_WINDOW):
+    # zero-copy (len(batt)-win+1, win) view; row i is batt[i:i+win]
+    return sliding_window_view(np.asarray(batt, dtype=np.float64), win)
+
+def training_windows(batt, win=LR_WINDOW):
+    # (X, y) pairs used to fit the battery LR; like the original loop the last
+    # full window is left out
+    n = len(batt) - win - 1
+    if n <= 0:
+        return np.empty((0, win)), np.empty(0)
+    return np.ascontiguousarray(battery_windows(batt, win)[:n]), np.asarray(batt[win:win + n], dtype=np.float64)
+
+def predict_next(batt, lr, n=None, win=LR_WINDOW):
+    # LinearRegression is linear, so every window is scored with one dot product
+    # against coef_; prediction k targets batt[win + k]
+    windows = battery_windows(batt, win)
+    if n is not None:
+        windows = windows[:n]
+    # BLAS takes a different summation path for the strided view; the contiguous copy
+    # keeps predictions bit-identical to lr.predict()
+    return np.ascontiguousarray(windows) @ np.asarray(lr.coef_).ravel() + lr.intercept_
+
+def predictions_and_residuals(batt, lr, n=None, win=LR_WINDOW):
+    # predicted values and |actual - predicted| for the first n windows (all windows
+    # with a target if n is None); both target batt[win:win + n]
+    n = len(batt) - win if n is None else n
+    if n <= 0:
+        return np.empty(0), np.empty(0)
+    pred = predict_next(batt, lr, n, win)
+    return pred, np.abs(np.asarray(batt[win:win + n], dtype=np.float64) - pred)
+
+def prediction_column(batt, lr, win=LR_WINDOW):
+    # per-row prediction aligned with batt (NaN for the first win rows, which have no
+    # full window behind them), e.g. the lr_batt_pred overlay for raw telemetry
+    pred = np.full(len(batt), np.nan)
+    pred[win:] = predictions_and_residuals(batt, lr, win=win)[0]
+    return pred
+
+def residuals(batt, lr, n=None, win=LR_WINDOW):
+    return predictions_and_residuals(batt, lr, n, win)[1]
+
+def residual_threshold(res, method="global", k=3.0, window=240):
+    # global: mean + k*std over all residuals (the original rule)
+    # rolling: trailing mean + k*std over `window` residuals, one threshold per residual
+    # robust: median + k*1.4826*MAD, less sensitive to the anomalies it is looking for
+    if method == "global":
+        return res.mean() + k*res.std()
+    if method == "rolling":
+        r = pd.Series(res).rolling(window, min_periods=2)
+        return (r.mean() + k*r.std(ddof=0)).bfill().to_numpy()
+    if method == "robust":
+        med = np.median(res)
+        return med + k*1.4826*np.median(np.abs(res - med))
+    raise ValueError(f"Unknown threshold method: {method}")
+
+def residual_flags(res, method="global", k=3.0, window=240):
+    if len(res) == 0:
+        return np.zeros(0, dtype=int)
+    return (res > residual_threshold(res, method, k, window)).astype(int)
@@ -0,0 +1,195 @@
+
+import argparse, hashlib, os
+import numpy as np
+
+# Array-backed IsolationForest scorer. All trees are flattened into one set of
+# contiguous node arrays (feature, threshold, left, right, leaf value) and a batch is
+# evaluated level by level over every tree at once: max_depth vectorized steps instead
+# of one sklearn tree.apply() per tree.
+#
+# The StandardScaler is folded into the thresholds. sklearn compares
+# float32((x - mean) / scale) <= t; that predicate is monotone in x, so for every
+# node we search for the largest float64 x* where it still holds and compare the
+# raw feature against x* instead. Leaf values and the per-tree accumulation order
+# follow IsolationForest._compute_score_samples, so scores are bit-identical.
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def sources_sha256(paths):
+    # identifies the forest + scaler files a compiled forest was built from
+    return ",".join(file_sha256(p) for p in paths if p)
+
+_SIGN = np.int64(-0x8000000000000000)
+_ABS = np.int64(0x7FFFFFFFFFFFFFFF)
+
+def _to_ordered(d):
+    # float64 -> int64 with the same ordering
+    b = np.asarray(d, dtype=np.float64).view(np.int64)
+    return np.where(b < 0, -(b & _ABS), b)
+
+def _from_ordered(o):
+    b = np.where(o < 0, (-o) | _SIGN, o)
+    return b.view(np.float64)
+
+def _fold_thresholds(threshold, mean, scale):
+    # largest raw x with float32((x - mean) / scale) <= threshold, per node. The search
+    # probes values near +-float64 max, whose scaled float32 overflows to +-inf; that is
+    # the intended comparison, so the overflow warnings are silenced
+    def holds(x):
+        with np.errstate(over="ignore", invalid="ignore"):
+            return ((x - mean) / scale).astype(np.float32) <= threshold
+    lo = np.full(len(threshold), _to_ordered(-np.finfo(np.float64).max))
+    hi = np.full(len(threshold), _to_ordered(np.finfo(np.float64).max))
+    never = ~holds(_from_ordered(lo))
+    always = holds(_from_ordered(hi))
+    # invariant: holds(lo) and not holds(hi + 1); ~64 halvings pin down every node
+    while (lo < hi).any():
+        mid = lo // 2 + hi // 2 + ((lo % 2) + (hi % 2)) // 2
+        mid = np.maximum(mid, lo + 1)
+        ok = holds(_from_ordered(mid)) & (mid <= hi)
+        lo = np.where(ok, mid, lo)
+        hi = np.where(ok, hi, mid - 1)
+    out = _from_ordered(lo)
+    out[never] = -np.inf
+    out[always] = np.inf
+    return out
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, leaf_value, roots, max_depth, n_features, denominator, offset):
+        self.feature = feature        # global feature index per node (0 for leaves)
+        self.threshold = threshold    # raw-space threshold per node (+inf for leaves)
+        self.left = left              # left child id (right child is left + 1); leaves point at themselves
+        self.leaf_value = leaf_value  # path length + c(n) - 1 per leaf (0 for split nodes)
+        self.roots = roots            # root node id per tree
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.denominator = float(denominator)
+        self.offset = float(offset)
+        self.sources = ""             # sources_sha256() of the compiled files, when saved with it
+
+    @classmethod
+    def from_sklearn(cls, iso, scaler=None):
+        from sklearn.ensemble._iforest import _average_path_length
+        n_features = iso.n_features_in_
+        mean = np.zeros(n_features) if scaler is None or scaler.mean_ is None else scaler.mean_
+        scale = np.ones(n_features) if scaler is None or scaler.scale_ is None else scaler.scale_
+        feats, thrs, lefts, vals, roots = [], [], [], [], []
+        base, max_depth = 0, 0
+        for t, (est, features) in enumerate(zip(iso.estimators_, iso.estimators_features_)):
+            tree = est.tree_
+            # breadth-first relabel so that every right child is left child + 1
+            order, left_new = [0], {}
+            for node in order:
+                if tree.children_left[node] != -1:
+                    left_new[node] = len(order)
+                    order.extend([tree.children_left[node], tree.children_right[node]])
+            order = np.asarray(order)
+            new_id = np.empty(len(order), dtype=np.intp)
+            new_id[order] = np.arange(len(order))
+            leaf = tree.children_left[order] == -1
+            leaf_value = iso._decision_path_lengths[t] + iso._average_path_length_per_tree[t] - 1.0
+            roots.append(base)
+            feats.append(np.where(leaf, 0, np.asarray(features)[np.maximum(tree.feature[order], 0)]))
+            thrs.append(np.where(leaf, np.inf, tree.threshold[order]))
+            lefts.append(np.array([left_new.get(node, new_id[node]) for node in order]) + base)
+            vals.append(np.where(leaf, leaf_value[order], 0.0))
+            max_depth = max(max_depth, tree.max_depth)
+            base += len(order)
+        feature = np.concatenate(feats).astype(np.int32)
+        threshold = np.concatenate(thrs)
+        split = np.isfinite(threshold)
+        threshold[split] = _fold_thresholds(threshold[split], mean[feature[split]], scale[feature[split]])
+        denominator = len(iso.estimators_) * _average_path_length([iso._max_samples])[0]
+        return cls(feature, threshold, np.concatenate(lefts).astype(np.int32), np.concatenate(vals),
+                   np.asarray(roots, dtype=np.int32), max_depth, n_features, denominator, iso.offset_)
+
+    def save(self, path):
+        # sources is checked by AnomalyDetector before it trusts a cached compile
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                 leaf_value=self.leaf_value, roots=self.roots,
+                 meta=np.array([self.max_depth, self.n_features, self.denominator, self.offset]),
+                 sources=np.array(self.sources))
+
+    @classmethod
+    def load(cls, path):
+        z = np.load(path)
+        max_depth, n_features, denominator, offset = z["meta"]
+        compiled = cls(z["feature"], z["threshold"], z["left"], z["leaf_value"], z["roots"],
+                       max_depth, n_features, denominator, offset)
+        compiled.sources = str(z["sources"]) if "sources" in z.files else ""
+        return compiled
+
+    def _depths(self, X):
+        # X: C-contiguous (n, n_features) float64; nodes holds one node id per (sample, tree)
+        flat = X.ravel()
+        row_base = (np.arange(len(X), dtype=np.int32) * self.n_features)[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            x = flat.take(row_base + self.feature.take(nodes))
+            nodes = self.left.take(nodes) + (x > self.threshold.take(nodes))
+        # sequential sum over trees in estimator order, as sklearn accumulates it
+        return np.cumsum(self.leaf_value.take(nodes), axis=1)[:, -1]
+
+    def decision_function(self, X, batch_size=8192):
+        # X: raw (unscaled) features; equals iso.decision_function(scaler.transform(X))
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        depths = np.empty(len(X))
+        for start in range(0, len(X), batch_size):
+            depths[start:start + batch_size] = self._depths(X[start:start + batch_size])
+        if self.denominator != 0:
+            scores = 2 ** (-(depths / self.denominator))
+        else:
+            scores = 2 ** -np.ones_like(depths)
+        return -scores - self.offset
+
+    def predict_iso(self, X):
+        decision = self.decision_function(X)
+        return (decision < 0).astype(int), -decision
+
+    def path_attributions(self, X, batch_size=1024):
+        # per-feature share of anomaly evidence: every split on a sample's path in a
+        # tree credits its feature with 1/path length of that tree (short paths = easy to
+        # isolate), summed over trees and normalised to 1 per row
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        out = np.zeros((len(X), self.n_features))
+        for start in range(0, len(X), batch_size):
+            xb = X[start:start + batch_size]
+            n = len(xb)
+            flat = xb.ravel()
+            rows = np.arange(n, dtype=np.int64)[:, None]
+            row_base = rows.astype(np.int32) * self.n_features
+            nodes = np.repeat(self.roots[None, :], n, axis=0)
+            path = []
+            for _ in range(self.max_depth):
+                split = self.left.take(nodes) != nodes
+                path.append(np.where(split, self.feature.take(nodes), -1))
+                x = flat.take(row_base + self.feature.take(nodes))
+                nodes = self.left.take(nodes) + (x > self.threshold.take(nodes))
+            weight = 1.0 / np.maximum(self.leaf_value.take(nodes), 1.0)
+            attr = np.zeros(n * self.n_features)
+            for feats in path:
+                used = feats >= 0
+                attr += np.bincount((rows * self.n_features + feats)[used], weights=weight[used],
+                                    minlength=n * self.n_features)
+            attr = attr.reshape(n, self.n_features)
+            out[start:start + n] = attr / np.maximum(attr.sum(axis=1, keepdims=True), 1e-12)
+        return out
+
+if __name__ == "__main__":
+    import joblib
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", default="model")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    paths = [os.path.join(args.model_dir, name) for name in ("isoforest.joblib", "scaler.joblib")]
+    iso, scaler = (joblib.load(p) for p in paths)
+    out = args.output or os.path.join(args.model_dir, "isoforest_compiled.npz")
+    compiled = CompiledForest.from_sklearn(iso, scaler)
+    compiled.sources = sources_sha256(paths)
+    compiled.save(out)
+    print("Saved compiled forest to", out)
@@ -0,0 +1,69 @@
+
+import numpy as np
+import pandas as pd
+
+# Explanations for flagged rows, computed once in the pipeline for all of them:
+#  - dev*: the top-k features by z-score against per-feature statistics of the run
+#  - attr*: the top-k features by IsolationForest path-length attribution (share of
+#    1/path-length credited to the features split on along each tree's path)
+# Statistics are kept as mergeable (count, mean, m2) moments so chunked and
+# incremental runs can combine them.
+EXPLAIN_TOP_K = 3
+MIN_STD = 1e-6
+
+def feature_moments(X):
+    # reduced along contiguous rows of X.T: the result does not depend on whether the
+    # caller's array is C- or Fortran-ordered, so reruns give bit-identical explanations
+    X = np.asarray(X, dtype=np.float64)
+    if len(X) == 0:
+        return 0, np.zeros(X.shape[1]), np.zeros(X.shape[1])
+    cols = np.ascontiguousarray(X.T)
+    mean = cols.mean(axis=1)
+    return len(X), mean, ((cols - mean[:, None]) ** 2).sum(axis=1)
+
+def merge_feature_moments(a, b):
+    # Chan et al. pairwise update, per feature
+    (na, ma, m2a), (nb, mb, m2b) = a, b
+    if na == 0:
+        return b
+    if nb == 0:
+        return a
+    total = na + nb
+    delta = np.asarray(mb) - np.asarray(ma)
+    return total, ma + delta * nb / total, m2a + m2b + delta ** 2 * na * nb / total
+
+def moments_mean_std(moments, ddof=1):
+    # sample std like pandas; constant features get MIN_STD so z stays finite
+    count, mean, m2 = moments
+    std = np.sqrt(np.asarray(m2) / max(count - ddof, 1))
+    return np.asarray(mean), np.where(std == 0, MIN_STD, std)
+
+def top_k(values, k=EXPLAIN_TOP_K, key=np.abs):
+    # (column index, value) of the k largest key(values) per row, largest first
+    k = min(k, values.shape[1])
+    order = np.argsort(-key(values), axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(values, order, axis=1)
+
+def explanation_frame(X, features, mean, std, k=EXPLAIN_TOP_K, forest=None, index=None):
+    # dev{i}_feature / dev{i}_z (signed z-score) and, with a CompiledForest,
+    # attr{i}_feature / attr{i}_share for every row of X
+    X = np.asarray(X, dtype=np.float64)
+    names = np.asarray(features, dtype=object)
+    cols = {}
+    idx, z = top_k((X - mean) / std, k)
+    for i in range(idx.shape[1]):
+        cols[f"dev{i+1}_feature"] = names[idx[:, i]]
+        cols[f"dev{i+1}_z"] = z[:, i]
+    if forest is not None:
+        idx, share = top_k(forest.path_attributions(X), k, key=lambda v: v)
+        for i in range(idx.shape[1]):
+            cols[f"attr{i+1}_feature"] = names[idx[:, i]]
+            cols[f"attr{i+1}_share"] = share[:, i]
+    return pd.DataFrame(cols, index=index)
+
+def explain_flagged(df, features, moments, forest=None, k=EXPLAIN_TOP_K):
+    # explanations for the rows of df with combined_flag == 1, indexed like df
+    flagged = df.index[df["combined_flag"].to_numpy() == 1]
+    X = df.loc[flagged, features].fillna(0.0).to_numpy()
+    mean, std = moments_mean_std(moments)
+    return explanation_frame(X, features, mean, std, k, forest, index=flagged)
@@ -0,0 +1,76 @@
+
+import queue
+import threading
+import time
+import numpy as np
+from src.telemetry.metrics import Counter, Histogram
+
+INFERENCE_SECONDS = Histogram("telemetry_inference_seconds", "predict_iso latency per micro-batch")
+BATCH_POINTS = Histogram("telemetry_inference_batch_points", "points per scored micro-batch",
+                         buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048))
+PREDICTION_ERRORS = Counter("telemetry_prediction_errors_total", "micro-batches that failed to score")
+
+class MicroBatchScorer:
+    # Collects points from any number of producer threads and scores them with one
+    # predict_iso() call per micro-batch. A batch is closed when it reaches max_batch
+    # points or when its oldest point has waited max_latency seconds, so sklearn's
+    # per-call overhead is paid once per batch instead of once per point.
+    # Scored batches are handed to on_scored(points, flags, scores) in arrival order.
+    def __init__(self, detector, on_scored, max_batch=256, max_latency=0.05):
+        self.detector = detector
+        self.on_scored = on_scored
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.queue = queue.Queue()
+        self.running = False
+        self.thread = None
+
+    def submit(self, point, features):
+        # features: 1-D feature vector in FEATURES order
+        self.queue.put((point, features))
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _next_batch(self):
+        try:
+            first = self.queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def score(self, X):
+        detector = self.detector  # one model version per batch, even across a hot swap
+        if not detector.has_iso:
+            return np.zeros(len(X), dtype=int), np.zeros(len(X))
+        try:
+            with INFERENCE_SECONDS.time():
+                return detector.predict_iso(X)
+        except Exception as e:
+            PREDICTION_ERRORS.inc()
+            print(f"Prediction error: {e}")
+            return np.zeros(len(X), dtype=int), np.zeros(len(X))
+
+    def _run_loop(self):
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            points = [p for p, _ in batch]
+            BATCH_POINTS.observe(len(points))
+            flags, scores = self.score(np.array([f for _, f in batch], dtype=np.float64))
+            self.on_scored(points, flags, scores)
@@ -0,0 +1,157 @@
+
+import json, os, shutil, threading, time
+from src.ai.anomaly_detector import AnomalyDetector
+from src.ai.compiled_forest import file_sha256
+
+# Versioned model store under model/:
+#   model/manifest.json               {"current": "<version>", "versions": {...}}
+#   model/versions/<version>/*.joblib
+# Each version records the sha256 of its files and the feature order the forest was
+# trained on. Without a manifest the flat model/*.joblib files are served as the
+# "legacy" version, so existing model folders keep working.
+MODEL_FILES = {"iso": "isoforest.joblib", "scaler": "scaler.joblib", "lr": "lr_battery.joblib"}
+FEATURES = ["battery_v","solar_i","temp","cpu"] + [f"extra{i}" for i in range(8)]
+LEGACY_VERSION = "legacy"
+
+class ModelRegistry:
+    def __init__(self, model_dir="model"):
+        self.model_dir = model_dir
+        self.manifest_path = os.path.join(model_dir, "manifest.json")
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"current": LEGACY_VERSION, "versions": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def current_version(self):
+        return self.manifest()["current"]
+
+    def version_dir(self, version):
+        if version == LEGACY_VERSION:
+            return self.model_dir
+        return os.path.join(self.model_dir, "versions", version)
+
+    def paths(self, version=None):
+        version = version or self.current_version()
+        d = self.version_dir(version)
+        return {key: os.path.join(d, name) for key, name in MODEL_FILES.items()}
+
+    def features(self, version=None):
+        version = version or self.current_version()
+        return self.manifest()["versions"].get(version, {}).get("features", FEATURES)
+
+    def verify(self, version):
+        # raise if a registered file no longer matches its recorded hash
+        info = self.manifest()["versions"].get(version)
+        if info is None:
+            return
+        for key, path in self.paths(version).items():
+            if file_sha256(path) != info["sha256"][key]:
+                raise ValueError(f"Model file {path} does not match manifest hash")
+
+    def register(self, files, features=FEATURES, version=None, make_current=True):
+        # copy {key: path} model files into a new version and (optionally) point
+        # "current" at it; the manifest is replaced atomically. Generated names get a
+        # -2, -3, ... suffix when registered within the same second; an explicit
+        # version that already exists is refused
+        versions = self.manifest()["versions"]
+        if version is not None:
+            if version in versions or version == LEGACY_VERSION or os.path.exists(self.version_dir(version)):
+                raise ValueError(f"Model version {version} already exists")
+        else:
+            base = time.strftime("%Y%m%d-%H%M%S")
+            version, n = base, 1
+            while version in versions or os.path.exists(self.version_dir(version)):
+                n += 1
+                version = f"{base}-{n}"
+        d = self.version_dir(version)
+        os.makedirs(d)
+        hashes = {}
+        for key, src in files.items():
+            dst = os.path.join(d, MODEL_FILES[key])
+            shutil.copyfile(src, dst)
+            hashes[key] = file_sha256(dst)
+        manifest = self.manifest()
+        manifest["versions"][version] = {"sha256": hashes, "features": list(features), "created": int(time.time())}
+        if make_current:
+            manifest["current"] = version
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+        return version
+
+    def activate(self, version):
+        manifest = self.manifest()
+        if version != LEGACY_VERSION and version not in manifest["versions"]:
+            raise KeyError(version)
+        manifest["current"] = version
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+# process-wide cache: (model_dir, version) -> AnomalyDetector
+_cache = {}
+_cache_lock = threading.Lock()
+
+def get_detector(model_dir="model", version=None, mmap_mode="r"):
+    # load a model version once per process; large arrays are memory-mapped when the
+    # joblib files allow it (uncompressed dumps). Only the compiled forest is loaded up
+    # front, the joblib models on first use (see AnomalyDetector)
+    registry = ModelRegistry(model_dir)
+    version = version or registry.current_version()
+    key = (os.path.abspath(model_dir), version)
+    with _cache_lock:
+        detector = _cache.get(key)
+        if detector is None:
+            registry.verify(version)
+            features = registry.features(version)
+            if features != FEATURES:
+                # every caller builds feature rows in FEATURES order
+                raise ValueError(f"Model version {version} was trained on features {features}, expected {FEATURES}")
+            paths = registry.paths(version)
+            detector = AnomalyDetector(model_path=paths["iso"], scaler_path=paths["scaler"],
+                                       lr_path=paths["lr"], mmap_mode=mmap_mode, lazy=True)
+            detector.version = version
+            _cache[key] = detector
+        return detector
+
+class ModelWatcher:
+    # polls the manifest and calls on_change(detector) when "current" moves to a new
+    # version; the new detector's hashes are verified and its compiled forest loaded
+    # before the callback swaps it in, the joblib models load lazily (see get_detector)
+    def __init__(self, model_dir, on_change, interval=5.0):
+        self.registry = ModelRegistry(model_dir)
+        self.model_dir = model_dir
+        self.on_change = on_change
+        self.interval = interval
+        self.version = None
+        self.running = False
+
+    def check(self):
+        version = self.registry.current_version()
+        if version != self.version:
+            detector = get_detector(self.model_dir, version)
+            self.version = version
+            self.on_change(detector)
+            return True
+        return False
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.version = self.registry.current_version()
+            threading.Thread(target=self._run_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def _run_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Model reload failed: {e}")
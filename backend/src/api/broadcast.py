@@ -0,0 +1,64 @@
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+def sse_frame(point, epoch):
+    # one Server-Sent Events message; "<epoch>:<point id>" is the SSE event id so
+    # EventSource reconnects resume with a Last-Event-ID header. Point ids restart with
+    # the process, so the epoch tells a resume id from a previous server run apart
+    return f"id: {epoch}:{point['id']}\ndata: {json.dumps(point)}\n\n".encode()
+
+def reset_frame(epoch):
+    # tells a resuming client that its points came from a previous server run
+    return f"event: reset\ndata: {epoch}\n\n".encode()
+
+def parse_event_id(event_id):
+    # (epoch, point id) of a Last-Event-ID, or None when it is malformed
+    epoch, _, point_id = (event_id or "").rpartition(":")
+    return (epoch, int(point_id)) if epoch and point_id.isdigit() else None
+
+class TelemetryBroadcaster:
+    # fan-out of new telemetry points to any number of stream subscribers. The producer
+    # thread serializes each point once into a shared history of frames; subscribers
+    # wait on a single asyncio event and send whatever frames they have not seen yet.
+    def __init__(self, history=1024):
+        self.epoch = str(time.time_ns() // 1_000_000)   # process start, ms
+        self.frames = deque(maxlen=history)   # (id, frame bytes), oldest first
+        self.lock = threading.Lock()
+        self.loop = None
+        self.event = None
+
+    def attach(self, loop):
+        # bind to the server's event loop (called from the lifespan hook)
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def publish(self, point):
+        # called from the simulator thread
+        frame = sse_frame(point, self.epoch)
+        with self.lock:
+            self.frames.append((point["id"], frame))
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    def frames_after(self, last_id):
+        # frames with id > last_id, oldest first, or None when the history no longer
+        # reaches back to last_id (frames after it may have been evicted)
+        with self.lock:
+            out = []
+            for fid, frame in reversed(self.frames):
+                if fid <= last_id:
+                    break
+                out.append((fid, frame))
+            else:
+                if out:
+                    return None
+        out.reverse()
+        return out
@@ -0,0 +1,84 @@
+
+import json
+import numpy as np
+
+# Response encodings for column snapshots ({field: array}) of the live buffer, picked by
+# content negotiation. JSON keeps the record list the dashboard reads; the binary
+# formats are column-oriented, so no key is repeated per point:
+#  - Arrow IPC stream (pyarrow)
+#  - MessagePack {field: [values]} (msgpack, when installed)
+#  - packed little-endian records, one fixed-size struct per point; the layout is sent
+#    in the X-Record-Format header as "name:numpy type" pairs
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/x-msgpack"
+STRUCT = "application/octet-stream"
+# short names accepted in ?format= instead of an Accept header
+FORMATS = {"json": JSON, "arrow": ARROW, "msgpack": MSGPACK, "struct": STRUCT}
+
+def _installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+def available_types():
+    # media types this process can produce, in server preference order
+    types = [JSON, ARROW if _installed("pyarrow") else None, MSGPACK if _installed("msgpack") else None, STRUCT]
+    return [t for t in types if t is not None]
+
+def negotiate(accept, available):
+    # best media type for an Accept header, or None when nothing acceptable can be
+    # produced. Each type takes the q of its most specific matching range (exact, then
+    # type/*, then */*); highest q wins, ties go to the server's preference order
+    if not accept:
+        return available[0]
+    ranges = {}
+    for item in accept.split(","):
+        parts = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranges[parts[0].lower()] = q
+    best, best_q = None, 0.0
+    for t in available:
+        for media in (t, t.split("/")[0] + "/*", "*/*"):
+            if media in ranges:
+                if ranges[media] > best_q:
+                    best, best_q = t, ranges[media]
+                break
+    return best
+
+def record_dtype(columns):
+    return np.dtype([(name, np.asarray(col).dtype.newbyteorder("<")) for name, col in columns.items()])
+
+def encode_columns(columns, media_type):
+    # (body bytes, extra headers)
+    if media_type == JSON:
+        names = list(columns)
+        lists = [columns[name].tolist() for name in names]
+        return json.dumps([dict(zip(names, row)) for row in zip(*lists)]).encode(), {}
+    if media_type == ARROW:
+        import pyarrow as pa
+        table = pa.table({name: np.asarray(col) for name, col in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), {}
+    if media_type == MSGPACK:
+        import msgpack
+        return msgpack.packb({name: col.tolist() for name, col in columns.items()}), {}
+    if media_type == STRUCT:
+        dtype = record_dtype(columns)
+        n = len(next(iter(columns.values()))) if columns else 0
+        records = np.empty(n, dtype=dtype)
+        for name, col in columns.items():
+            records[name] = col
+        layout = ",".join(f"{name}:{dtype[name].str}" for name in dtype.names)
+        return records.tobytes(), {"X-Record-Format": layout}
+    raise ValueError(f"Unsupported media type: {media_type}")
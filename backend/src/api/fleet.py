@@ -0,0 +1,136 @@
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.telemetry.ring_buffer import TelemetryRingBuffer, columns_to_records
+from src.telemetry.metrics import Histogram
+
+FLEET_SIZE = int(os.environ.get("TELEMETRY_FLEET_SIZE", 0))
+FLEET_TICK_INTERVAL_SEC = float(os.environ.get("TELEMETRY_FLEET_TICK_INTERVAL", 1.0))
+FLEET_CAPACITY = int(os.environ.get("TELEMETRY_FLEET_CAPACITY", 3600))
+
+ANOMALY_TYPES = ["battery", "temp", "comm"]
+FLEET_COLUMNS = {"timestamp": np.int64, "battery_v": np.float64, "solar_i": np.float64,
+                 "temp": np.float64, "cpu": np.int64, "comm": np.int64, "id": np.int64,
+                 **{f"extra{i}": np.float64 for i in range(8)},
+                 "iso_flag": np.int64, "iso_score": np.float64, "combined_flag": np.int64}
+FEATURES = ["battery_v","solar_i","temp","cpu"] + [f"extra{i}" for i in range(8)]
+FLEET_TICK_SECONDS = Histogram("telemetry_fleet_tick_seconds", "time per fleet tick stage (all satellites)")
+
+class FleetSimulator:
+    # N satellites advanced together: every tick generates one (N,) array per field
+    # with the TelemetrySimulator dynamics, scores all N points with a single
+    # predict_iso() call and appends one row to a (capacity, N) ring buffer.
+    # Each satellite has its own orbit phase and anomaly state.
+    def __init__(self, detector, n_satellites=FLEET_SIZE, tick_interval=FLEET_TICK_INTERVAL_SEC,
+                 capacity=FLEET_CAPACITY, seed=None):
+        self.detector = detector
+        self.n = n_satellites
+        self.tick_interval = tick_interval
+        self.rng = np.random.default_rng(seed)
+        self.phase = self.rng.uniform(0, 90, n_satellites)       # minutes into the 90 min orbit
+        self.anomaly_type = np.full(n_satellites, -1)            # index into ANOMALY_TYPES, -1 = none
+        self.anomaly_duration = np.zeros(n_satellites, dtype=int)
+        self.buffer = TelemetryRingBuffer(FLEET_COLUMNS, capacity, width=n_satellites)
+        self.lock = threading.Lock()
+        self.running = False
+        self.tick_count = 0
+
+    def start(self):
+        if not self.running and self.n > 0:
+            self.running = True
+            threading.Thread(target=self._run_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def inject(self, sat_id, anomaly_type):
+        self.anomaly_type[sat_id] = ANOMALY_TYPES.index(anomaly_type)
+        self.anomaly_duration[sat_id] = 5
+
+    def _generate_tick(self, t):
+        n, rng = self.n, self.rng
+        orbit = np.sin(2*np.pi*(t + self.phase)/90)
+        sun = np.maximum(0, orbit)
+        battery = 3.9 - 0.0002*(t % 1440) + 0.05*sun + rng.normal(0, 0.02, n)
+        solar = 0.2 + 0.15*sun + rng.normal(0, 0.02, n)
+        temp = 25 + 4*orbit + rng.normal(0, 0.8, n)
+        cpu = np.clip(20 + rng.normal(0, 5, n).astype(int), 1, 95)
+        comm = np.zeros(n, dtype=np.int64)
+        extras = rng.normal(0, 1, (n, 8))
+
+        # random anomaly injection for idle satellites
+        start = (self.anomaly_duration == 0) & (rng.random(n) < 0.02)
+        self.anomaly_type[start] = rng.integers(0, len(ANOMALY_TYPES), int(start.sum()))
+        self.anomaly_duration[start] = 5
+
+        active = self.anomaly_duration > 0
+        batt_anom = active & (self.anomaly_type == 0)
+        temp_anom = active & (self.anomaly_type == 1)
+        battery[batt_anom] -= rng.uniform(0.5, 1.2, int(batt_anom.sum()))
+        temp[temp_anom] += rng.uniform(15, 50, int(temp_anom.sum()))
+        comm[active & (self.anomaly_type == 2)] = 2
+        self.anomaly_duration[active] -= 1
+        self.anomaly_type[active & (self.anomaly_duration <= 0)] = -1
+
+        cols = {"timestamp": np.full(n, int(time.time() * 1000)), "battery_v": battery,
+                "solar_i": solar, "temp": temp, "cpu": cpu, "comm": comm, "id": np.full(n, t)}
+        for i in range(8):
+            cols[f"extra{i}"] = extras[:, i]
+        return cols
+
+    def _score(self, cols):
+        X = np.column_stack([cols[f] for f in FEATURES]).astype(np.float64)
+        detector = self.detector
+        if detector.has_iso:
+            flags, scores = detector.predict_iso(X)
+        else:
+            flags, scores = np.zeros(self.n, dtype=int), np.zeros(self.n)
+        cols["iso_flag"] = flags
+        cols["iso_score"] = scores
+        rule = (cols["battery_v"] < 3.2) | (cols["temp"] > 70) | (cols["comm"] == 2)
+        cols["combined_flag"] = ((flags == 1) | rule).astype(np.int64)
+        return cols
+
+    def step(self):
+        with FLEET_TICK_SECONDS.time(stage="generate"):
+            cols = self._generate_tick(self.tick_count)
+        with FLEET_TICK_SECONDS.time(stage="score"):
+            cols = self._score(cols)
+        self.tick_count += 1
+        with self.lock, FLEET_TICK_SECONDS.time(stage="buffer_append"):
+            self.buffer.append(cols)
+
+    def _run_loop(self):
+        while self.running:
+            started = time.monotonic()
+            try:
+                self.step()
+            except Exception as e:
+                print(f"Fleet tick error: {e}")
+            time.sleep(max(0.0, self.tick_interval - (time.monotonic() - started)))
+
+    def get_latest_columns(self, sat_id, n=50):
+        with self.lock:
+            cols = self.buffer.latest(n)
+            return {name: np.array(col[:, sat_id]) for name, col in cols.items()}
+
+    def get_latest(self, sat_id, n=50):
+        records = columns_to_records(self.get_latest_columns(sat_id, n))
+        for r in records:
+            r["sat_id"] = sat_id
+        return records
+
+    def summary(self):
+        # latest point status for every satellite, from the newest buffer row
+        with self.lock:
+            if len(self.buffer) == 0:
+                return []
+            last = {name: np.array(col[-1]) for name, col in self.buffer.latest(1).items()}
+        rule = (last["battery_v"] < 3.2) | (last["temp"] > 70) | (last["comm"] == 2)
+        status = np.where(rule, "critical", np.where(last["combined_flag"] == 1, "warning", "normal"))
+        return [{"sat_id": i, "id": int(last["id"][i]), "battery_v": float(last["battery_v"][i]),
+                 "temp": float(last["temp"][i]), "status": str(status[i])} for i in range(self.n)]
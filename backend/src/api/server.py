@@ -4,38 +4,80 @@ import os
 import sys
 import threading
 import time
-import struct
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import Optional
 
-import joblib
 import numpy as np
-import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 # Add project root to sys.path to ensure absolute imports work
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-from src.ai.anomaly_detector import AnomalyDetector
-from src.telemetry.generator import FIELD_NAMES
+from src.ai.model_registry import ModelRegistry, ModelWatcher, get_detector
+from src.ai.inference_service import MicroBatchScorer
+from src.telemetry.ring_buffer import TelemetryRingBuffer, columns_to_records
+from src.api.broadcast import TelemetryBroadcaster, parse_event_id, reset_frame, sse_frame
+from src.api.encoding import FORMATS, available_types, encode_columns, negotiate
+from src.api.fleet import FleetSimulator
+from src.telemetry.health import HealthStats
+from src.telemetry.metrics import REGISTRY, Counter, Gauge, Histogram, TimedLock
+
+ARCHIVE_DIR = "data/store"
+# pipeline output read by /anomalies, columnar first
+PROCESSED_OUTPUTS = ("data/processed.parquet", "data/processed.csv")
+STREAM_KEEPALIVE_SEC = 15.0
+STATS_WINDOW = 300   # points covered by /stats
+TICK_INTERVAL_SEC = float(os.environ.get("TELEMETRY_TICK_INTERVAL", 1.0))
+# micro-batching of live inference (see MicroBatchScorer)
+INFER_MAX_BATCH = int(os.environ.get("TELEMETRY_INFER_MAX_BATCH", 256))
+INFER_MAX_LATENCY_SEC = float(os.environ.get("TELEMETRY_INFER_MAX_LATENCY", 0.05))
+# points generated in one vectorized batch at startup, so charts start with a full window
+BACKFILL_POINTS = int(os.environ.get("TELEMETRY_BACKFILL_POINTS", STATS_WINDOW))
+MODEL_DIR = "model"
+MODEL_WATCH_INTERVAL_SEC = float(os.environ.get("TELEMETRY_MODEL_WATCH_INTERVAL", 5.0))
+BUFFER_CAPACITY = int(os.environ.get("TELEMETRY_BUFFER_CAPACITY", 86_400))
+# live buffer layout, in the key order of the /telemetry points
+BUFFER_COLUMNS = {"timestamp": np.int64, "battery_v": np.float64, "solar_i": np.float64,
+                  "temp": np.float64, "cpu": np.int64, "comm": np.int64, "id": np.int64,
+                  **{f"extra{i}": np.float64 for i in range(8)},
+                  "iso_flag": np.int64, "iso_score": np.float64, "combined_flag": np.int64}
+
+# hot-path instrumentation, scraped from /metrics
+TICK_STAGE_SECONDS = Histogram("telemetry_tick_stage_seconds", "time per simulator tick stage")
+TICKS = Counter("telemetry_ticks_total", "simulator ticks generated")
+DROPPED_TICKS = Counter("telemetry_dropped_ticks_total", "ticks skipped because the loop fell a full interval behind")
+LOCK_WAIT_SECONDS = Histogram("telemetry_lock_wait_seconds", "wait to acquire TelemetrySimulator.lock")
 
 # --- Simulation Logic ---
 
+def _base_dynamics(t, z):
+    # normal orbital dynamics for tick index t (scalar or array) and standard normal
+    # noise z (12 values per tick): battery, solar, temp, cpu, extras
+    orbit = np.sin(2*np.pi*t/90)
+    sun = np.maximum(0, orbit)
+    battery = 3.9 - 0.0002*(t % 1440) + 0.05*sun + 0.02*z[..., 0]
+    solar = 0.2 + 0.15*sun + 0.02*z[..., 1]
+    temp = 25 + 4*orbit + 0.8*z[..., 2]
+    cpu = np.clip(20 + (5*z[..., 3]).astype(np.int64), 1, 95)
+    return battery, solar, temp, cpu, z[..., 4:]
+
 
 class TelemetrySimulator:
-    def __init__(self):
-        self.data_buffer = []
-        self.max_buffer_size = 1000
+    def __init__(self, capacity=BUFFER_CAPACITY, tick_interval=TICK_INTERVAL_SEC):
+        self.data_buffer = TelemetryRingBuffer(BUFFER_COLUMNS, capacity)
+        self.max_buffer_size = capacity
+        self.tick_interval = tick_interval
+        self.broadcaster = TelemetryBroadcaster()
+        self.health = HealthStats(window=STATS_WINDOW)
         self.running = False
         self.tick_count = 0
-        self.detector = AnomalyDetector(
-            model_path="model/isoforest.joblib",
-            scaler_path="model/scaler.joblib",
-            lr_path="model/lr_battery.joblib"
-        )
-        self.lock = threading.Lock()
+        self.detector = get_detector(MODEL_DIR)
+        self.scorer = MicroBatchScorer(self.detector, self._publish_scored,
+                                       max_batch=INFER_MAX_BATCH, max_latency=INFER_MAX_LATENCY_SEC)
+        self.lock = TimedLock(LOCK_WAIT_SECONDS)
         
         # Simulation state
         self.current_anomaly_type = None
@@ -44,26 +86,20 @@ class TelemetrySimulator:
     def start(self):
         if not self.running:
             self.running = True
+            self.scorer.start()
             threading.Thread(target=self._run_loop, daemon=True).start()
     
     def stop(self):
         self.running = False
+        self.scorer.stop()
 
 
     def _generate_point(self, t):
         # Math from generator.py
-        orbit = np.sin(2*np.pi*t/90)
-        
-        # Base dynamics
-        # Noise increased slightly for visibility
-        battery = 3.9 - 0.0002*(t % 1440) + 0.05*(max(0, orbit)) + np.random.normal(0,0.02)
-        solar = 0.2 + 0.15*(max(0, orbit)) + np.random.normal(0,0.02)
-        temp = 25 + 4*orbit + np.random.normal(0,0.8)
-        cpu = max(1, min(95, 20 + int(np.random.normal(0,5))))
+        # Noise increased slightly for visibility; one draw covers all 12 noisy fields
+        battery, solar, temp, cpu, extras = _base_dynamics(t, np.random.standard_normal(12))
         comm = 0
-        
-        # Extras (noise)
-        extras = [np.random.normal(0,1) for _ in range(8)]
+        extras = extras.tolist()
         
         # Automatic Random Anomaly Injection (approx every 30-60s)
         if self.anomaly_duration == 0 and np.random.random() < 0.02:
@@ -98,68 +134,147 @@ class TelemetrySimulator:
             
         return point
 
+    def backfill(self, n=BACKFILL_POINTS):
+        # the n ticks before now in one vectorized batch (one noise draw, one predict_iso
+        # call, one buffer extend), without anomaly injection. The newest is stamped one
+        # interval before now, where the first live tick would have been
+        if n <= 0:
+            return 0
+        t = np.arange(self.tick_count, self.tick_count + n)
+        battery, solar, temp, cpu, extras = _base_dynamics(t, np.random.standard_normal((n, 12)))
+        age_ms = (np.arange(n, 0, -1) * self.tick_interval * 1000).astype(np.int64)
+        cols = {"timestamp": int(time.time() * 1000) - age_ms, "battery_v": battery, "solar_i": solar,
+                "temp": temp, "cpu": cpu, "comm": np.zeros(n, dtype=np.int64), "id": t}
+        for i in range(8):
+            cols[f"extra{i}"] = extras[:, i]
+        flags, scores = self.scorer.score(np.column_stack([battery, solar, temp, cpu, extras]))
+        cols["iso_flag"] = np.asarray(flags, dtype=np.int64)
+        cols["iso_score"] = np.asarray(scores, dtype=np.float64)
+        cols["combined_flag"] = ((cols["iso_flag"] == 1) | (battery < 3.2) | (temp > 70)).astype(np.int64)
+        with self.lock:
+            self.data_buffer.extend(cols)
+            for point in columns_to_records(cols):
+                self.health.add(point)
+        self.tick_count += n
+        return n
+
     def _run_loop(self):
+        # fixed-rate ticks: sleep until the next deadline; if a tick ran more than a
+        # whole interval late, the missed ticks are counted as dropped, not replayed.
+        # a non-positive interval ticks as fast as possible, so nothing is ever dropped
+        next_tick = time.monotonic()
         while self.running:
-            point = self._generate_point(self.tick_count)
+            with TICK_STAGE_SECONDS.time(stage="generate"):
+                point = self._generate_point(self.tick_count)
             self.tick_count += 1
             
-            # AI Prediction
+            # AI Prediction happens in micro-batches on the scorer thread
             # FEATURES = ["battery_v","solar_i","temp","cpu"] + [f"extra{i}" for i in range(8)]
-            feats = [point['battery_v'], point['solar_i'], point['temp'], point['cpu']]
-            feats.extend([point[f"extra{i}"] for i in range(8)])
-            
-            features = np.array([feats])
-            
-            is_anomaly = 0
-            iso_score = 0.0
+            with TICK_STAGE_SECONDS.time(stage="features"):
+                feats = [point['battery_v'], point['solar_i'], point['temp'], point['cpu']]
+                feats.extend([point[f"extra{i}"] for i in range(8)])
+            with TICK_STAGE_SECONDS.time(stage="submit"):
+                self.scorer.submit(point, feats)
+            TICKS.inc()
             
-            if self.detector.iso and self.detector.scaler:
-                try:
-                    flag, scores = self.detector.predict_iso(features)
-                    is_anomaly = int(flag[0])
-                    iso_score = float(scores[0])
-                except Exception as e:
-                    print(f"Prediction error: {e}")
-
-            # Append metadata
+            next_tick += self.tick_interval
+            lag = time.monotonic() - next_tick
+            if self.tick_interval > 0 and lag > self.tick_interval:
+                DROPPED_TICKS.inc(int(lag // self.tick_interval))
+                next_tick += (lag // self.tick_interval) * self.tick_interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def _publish_scored(self, points, flags, scores):
+        # called by the scorer with one scored micro-batch, in submission order
+        for point, flag, score in zip(points, flags, scores):
+            is_anomaly = int(flag)
             point['iso_flag'] = is_anomaly
-            point['iso_score'] = iso_score
+            point['iso_score'] = float(score)
             point['combined_flag'] = 1 if (is_anomaly or point['battery_v'] < 3.2 or point['temp'] > 70 or point['comm'] == 2) else 0
-            
-            with self.lock:
+        with self.lock, TICK_STAGE_SECONDS.time(stage="buffer_append"):
+            for point in points:
                 self.data_buffer.append(point)
-                if len(self.data_buffer) > self.max_buffer_size:
-                    self.data_buffer.pop(0)
-            
-            time.sleep(1.0) 
+                self.health.add(point)
+        for point in points:
+            self.broadcaster.publish(point)
+
+    def get_latest_columns(self, n=50):
+        # {field: array} copy of the newest n points; only the copy happens under the lock
+        with self.lock:
+            return self.data_buffer.snapshot(n)
 
     def get_latest(self, n=50):
+        return columns_to_records(self.get_latest_columns(n))
+
+    def latest_id(self):
+        # id of the newest buffered point, -1 while the buffer is empty
+        with self.lock:
+            return int(self.data_buffer.latest(1)["id"][0]) if len(self.data_buffer) else -1
+
+    def get_window(self, n=300, since_id=None):
+        # ({field: array} copy, newest id, points left out): the newest n points, or with
+        # since_id the oldest n after it, so a poller that continues from the last id it
+        # got misses nothing while more are left
+        with self.lock:
+            if since_id is not None:
+                cols, more = self.data_buffer.snapshot_after("id", since_id, n)
+            else:
+                cols, more = self.data_buffer.snapshot(n), 0
+            newest_id = int(self.data_buffer.latest(1)["id"][0]) if len(self.data_buffer) else -1
+        return cols, newest_id, more
+
+    def get_since(self, last_id, limit=None):
+        # points with id > last_id still in the buffer, oldest first
         with self.lock:
-            return list(self.data_buffer[-n:])
+            n = self.data_buffer.count_after("id", last_id)
+            cols = self.data_buffer.snapshot(n)
+        records = columns_to_records(cols)
+        return records[:limit] if limit else records
 
     def inject(self, anomaly_type):
         self.current_anomaly_type = anomaly_type
         self.anomaly_duration = 5 # Anomaly lasts 5 seconds (5 data points)
 
+    def swap_detector(self, detector):
+        # the new version's compiled forest is loaded before this point (its joblib
+        # models load on first use, which batches of live size never need); rebinding
+        # the reference is atomic, so the scorer finishes its current batch on the old
+        # version and picks up the new one on the next, without pausing the tick loop
+        self.detector = detector
+        self.scorer.detector = detector
+
 
 # --- API Setup ---
 
 simulator = TelemetrySimulator()
+# optional multi-satellite load-test fleet (TELEMETRY_FLEET_SIZE > 0), sharing the models
+fleet = FleetSimulator(simulator.detector)
+
+def _swap_models(detector):
+    simulator.swap_detector(detector)
+    fleet.detector = detector
+    print(f"Switched to model version {detector.version}")
+
+Gauge("telemetry_scorer_queue_depth", "points waiting for the micro-batch scorer", fn=simulator.scorer.queue.qsize)
+Gauge("telemetry_buffer_points", "points held in the live ring buffer", fn=lambda: len(simulator.data_buffer))
+
+# hot-reloads a new model version when model/manifest.json changes
+model_watcher = ModelWatcher(MODEL_DIR, _swap_models, interval=MODEL_WATCH_INTERVAL_SEC)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting simulation...")
-    # Pre-fill buffer slightly
-    for i in range(50):
-        simulator._run_loop()
-        if i == 0: simulator.running = True # Hack to run loop once 
-        simulator.running = False
-    
+    simulator.backfill()
+    simulator.broadcaster.attach(asyncio.get_running_loop())
     simulator.start()
+    fleet.start()
+    model_watcher.start()
     yield
     # Shutdown
+    model_watcher.stop()
     simulator.stop()
+    fleet.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -174,21 +289,145 @@ app.add_middleware(
 class AnomalyRequest(BaseModel):
     type: str
 
+def _telemetry_etag(newest_id, n, since_id, media_type):
+    # points never change once buffered, so the newest id identifies the window; ids
+    # restart with the process, so the broadcaster's start epoch tells server runs apart
+    since = "" if since_id is None else since_id
+    return f'"{simulator.broadcaster.epoch}-{newest_id}-{n}-{since}-{media_type.split("/")[1]}"'
+
 @app.get("/telemetry")
-def get_telemetry():
-    return simulator.get_latest(300)
+def get_telemetry(request: Request, n: int = 300, since_id: Optional[int] = None, format: Optional[str] = None):
+    # newest n points, or with since_id the oldest n newer ones (poll with X-Last-Id).
+    # Encoding from ?format= (json, arrow, msgpack, struct) or the Accept header, see
+    # src/api/encoding.py. A poll whose If-None-Match matches the current ETag gets a
+    # 304 before anything is copied or serialized.
+    if n < 1:
+        raise HTTPException(status_code=400, detail="n must be positive")
+    available = available_types()
+    if format is not None:
+        media_type = FORMATS.get(format)
+        if media_type not in available:
+            raise HTTPException(status_code=406, detail=f"Unsupported format; available: {', '.join(available)}")
+    else:
+        media_type = negotiate(request.headers.get("accept"), available)
+        if media_type is None:
+            raise HTTPException(status_code=406, detail=f"Acceptable types: {', '.join(available)}")
+    headers = {"Vary": "Accept", "Cache-Control": "no-cache"}
+    etag = _telemetry_etag(simulator.latest_id(), n, since_id, media_type)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    cols, newest_id, more = simulator.get_window(n, since_id)
+    body, extra = encode_columns(cols, media_type)
+    # X-Last-Id: where the next since_id poll continues from; X-More: points after this
+    # reply that the next poll will return
+    last_id = int(cols["id"][-1]) if len(cols["id"]) else newest_id
+    headers.update(extra, **{"ETag": _telemetry_etag(newest_id, n, since_id, media_type), "X-Last-Id": str(last_id),
+                             "X-More": str(more)})
+    return Response(content=body, media_type=media_type, headers=headers)
+
+@app.get("/telemetry/stream")
+async def stream_telemetry(request: Request, last_id: Optional[int] = None, backlog: int = 300):
+    # Server-Sent Events: pushes each new point once. Resumes after `last_id` (or the
+    # Last-Event-ID header sent by a reconnecting EventSource); a fresh subscriber
+    # first gets the newest `backlog` points. A Last-Event-ID from a previous server run
+    # gets a "reset" event, then the backlog, since its ids mean nothing here.
+    broadcaster = simulator.broadcaster
+    epoch = broadcaster.epoch
+    reset = False
+    header_id = request.headers.get("last-event-id")
+    if last_id is None and header_id:
+        resume = parse_event_id(header_id)
+        if resume is not None and resume[0] == epoch:
+            last_id = resume[1]
+        else:
+            reset = True
+
+    async def events():
+        if reset:
+            yield reset_frame(epoch)
+        cursor = last_id
+        if cursor is None:
+            initial = simulator.get_latest(backlog) if backlog > 0 else []
+        else:
+            initial = simulator.get_since(cursor)
+        if initial:
+            yield b"".join(sse_frame(p, epoch) for p in initial)
+            cursor = initial[-1]["id"]
+        elif cursor is None:
+            cursor = simulator.latest_id()
+        while not await request.is_disconnected():
+            event = broadcaster.event
+            frames = broadcaster.frames_after(cursor)
+            if frames is None:
+                # fell behind the shared history; catch up from the ring buffer
+                missed = simulator.get_since(cursor)
+                if missed:
+                    yield b"".join(sse_frame(p, epoch) for p in missed)
+                    cursor = missed[-1]["id"]
+                    continue
+                frames = []
+            if frames:
+                yield b"".join(frame for _, frame in frames)
+                cursor = frames[-1][0]
+                continue
+            try:
+                await asyncio.wait_for(event.wait(), timeout=STREAM_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/stats")
 def get_stats():
-    data = simulator.get_latest(300)
-    if not data:
-        return {"critical": 0, "warning": 0, "normal": 0}
-    
-    critical = sum(1 for d in data if d['battery_v'] < 3.2 or d['temp'] > 70 or d['comm'] == 2)
-    warning = sum(1 for d in data if d['combined_flag'] == 1) - critical
-    normal = len(data) - critical - warning
-    
-    return {"critical": critical, "warning": max(0, warning), "normal": max(0, normal)}
+    # running counters over the last STATS_WINDOW points; never touches raw points
+    with simulator.lock:
+        return simulator.health.window_counts()
+
+@app.get("/stats/aggregates")
+def get_stats_aggregates(bucket: str = "minute", limit: int = 60):
+    # tumbling per-minute or per-orbit health aggregates, newest last
+    if bucket not in ("minute", "orbit"):
+        raise HTTPException(status_code=400, detail="bucket must be 'minute' or 'orbit'")
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    with simulator.lock:
+        return {"bucket": bucket, "totals": simulator.health.total_counts(),
+                "aggregates": simulator.health.aggregates(bucket, limit)}
+
+@app.get("/archive")
+def get_archive(start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+                columns: Optional[str] = None, limit: int = 10000):
+    # time-range query over the on-disk packet store; columns is a comma-separated list
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    if not os.path.isdir(ARCHIVE_DIR):
+        raise HTTPException(status_code=404, detail="No telemetry archive found")
+    cols = None
+    if columns:
+        cols = [c.strip() for c in columns.split(",") if c.strip()]
+        from src.telemetry.generator import FIELD_NAMES
+        unknown = [c for c in cols if c not in FIELD_NAMES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {unknown}")
+    from src.telemetry.store import TelemetryStore   # pandas, only needed here
+    df = TelemetryStore(ARCHIVE_DIR).query(start_ts, end_ts, cols, limit=limit)
+    return df.to_dict(orient="records")
+
+@app.get("/anomalies")
+def get_anomalies(start_ts: Optional[int] = None, end_ts: Optional[int] = None, limit: int = 1000):
+    # flagged rows of the last pipeline run with their precomputed explanations
+    # (dev*/attr* columns), newest `limit` rows in ts order
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    from src.pipeline.output_store import flagged_path, read_processed
+    path = next((p for p in PROCESSED_OUTPUTS if os.path.exists(flagged_path(p))), None)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No processed output found; run the pipeline first")
+    df = read_processed(flagged_path(path), start_ts=start_ts, end_ts=end_ts)
+    df = df.sort_values("ts", kind="stable").tail(limit)
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
 
 @app.post("/inject_anomaly")
 def inject_anomaly(req: AnomalyRequest):
@@ -197,6 +436,54 @@ def inject_anomaly(req: AnomalyRequest):
     simulator.inject(req.type)
     return {"status": "injected", "type": req.type}
 
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus text exposition of the counters and histograms above
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/models")
+def get_models():
+    manifest = ModelRegistry(MODEL_DIR).manifest()
+    return {"active": simulator.detector.version, "current": manifest["current"],
+            "versions": manifest["versions"]}
+
+@app.post("/models/reload")
+def reload_models(version: Optional[str] = None):
+    # activate `version` (or re-read the manifest's current one) and swap it in now
+    registry = ModelRegistry(MODEL_DIR)
+    try:
+        if version:
+            registry.activate(version)
+        model_watcher.check()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown model version")
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"active": simulator.detector.version}
+
+def _check_satellite(sat_id):
+    if not 0 <= sat_id < fleet.n:
+        raise HTTPException(status_code=404, detail="Unknown satellite")
+
+@app.get("/satellites")
+def get_satellites():
+    return fleet.summary()
+
+@app.get("/satellites/{sat_id}/telemetry")
+def get_satellite_telemetry(sat_id: int, n: int = 300):
+    _check_satellite(sat_id)
+    if not 1 <= n <= fleet.buffer.capacity:
+        raise HTTPException(status_code=400, detail=f"n must be between 1 and {fleet.buffer.capacity}")
+    return fleet.get_latest(sat_id, n)
+
+@app.post("/satellites/{sat_id}/inject_anomaly")
+def inject_satellite_anomaly(sat_id: int, req: AnomalyRequest):
+    _check_satellite(sat_id)
+    if req.type not in ['battery', 'temp', 'comm']:
+        raise HTTPException(status_code=400, detail="Invalid anomaly type")
+    fleet.inject(sat_id, req.type)
+    return {"status": "injected", "type": req.type, "sat_id": sat_id}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,267 @@
+
+import json, os, shutil
+import numpy as np
+import pandas as pd
+from src.telemetry.health import STATUSES, health_counts, merge_counts
+
+# processed telemetry is written as CSV (export) or as a Parquet dataset directory,
+# chosen by the output path's extension. Parquet parts carry per-row-group min/max
+# statistics on ts, so readers can project columns and skip row groups by time.
+PARQUET_EXT = ".parquet"
+ROW_GROUP_SIZE = 65_536
+# parts under COMPACT_ROWS rows are merged once COMPACT_MIN_PARTS of them are adjacent
+# (a minute-interval incremental run adds one small part per run)
+COMPACT_ROWS = 4 * ROW_GROUP_SIZE
+COMPACT_MIN_PARTS = 16
+
+def is_parquet(path):
+    return os.path.splitext(path)[1] == PARQUET_EXT
+
+def flagged_path(output_path):
+    ext = os.path.splitext(output_path)[1] or ".csv"
+    return os.path.join(os.path.dirname(output_path), "flagged_events" + ext)
+
+def health_path(output_path):
+    # per output, like feature_stats_path
+    return output_path.rstrip("/") + ".health_summary.json"
+
+def run_stats_path(output_path):
+    return os.path.join(os.path.dirname(output_path), "run_stats.json")
+
+def write_run_stats(output_path, stats):
+    # per-run stage timings of the last pipeline run, replaced atomically
+    tmp = run_stats_path(output_path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp, run_stats_path(output_path))
+
+def feature_stats_path(output_path):
+    # named after the whole output name (extension included), so processed.csv and
+    # processed.parquet in the same directory keep their own stats
+    return output_path.rstrip("/") + ".feature_stats.json"
+
+def save_feature_stats(output_path, features, moments):
+    # mergeable per-feature (count, mean, m2) of everything written to the output
+    count, mean, m2 = moments
+    mean, m2 = np.asarray(mean, dtype=np.float64), np.asarray(m2, dtype=np.float64)
+    std = np.sqrt(m2 / max(count - 1, 1))
+    stats = {"features": list(features), "count": int(count), "mean": mean.tolist(),
+             "m2": m2.tolist(), "std": std.tolist()}
+    tmp = feature_stats_path(output_path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp, feature_stats_path(output_path))
+
+def load_feature_stats(output_path, features=None):
+    # {"features", "count", "mean", "m2", "std"} or None (missing / different features)
+    path = feature_stats_path(output_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        stats = json.load(f)
+    if features is not None and stats["features"] != list(features):
+        return None
+    for key in ("mean", "m2", "std"):
+        stats[key] = np.asarray(stats[key], dtype=np.float64)
+    return stats
+
+def load_health_summary(output_path):
+    # critical / warning / normal counts over the whole processed output, or None
+    path = health_path(output_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+class CsvSink:
+    def __init__(self, path, append=False):
+        self.f = open(path, "a" if append else "w", newline="")
+        self.header = not append
+
+    def write(self, df, start=0):
+        df.to_csv(self.f, index=False, header=self.header)
+        self.header = False
+
+    def flush(self):
+        self.f.flush()
+
+    def compact(self):
+        pass
+
+    def close(self):
+        self.f.close()
+
+class ParquetSink:
+    # one part file per write, named by the global packet index the chunk starts at, so
+    # an appended run just adds parts, a re-run of the same chunk replaces its part and
+    # a finished write is always a complete file.
+    # compact() merges runs of small adjacent parts into one part named after the first;
+    # the merged file is written as _compact-<first>-<last>.parquet (ignored by dataset
+    # readers, like every "_" file) before the parts it replaces are removed, so an
+    # interrupted compaction is finished by the next open
+    def __init__(self, path, append=False):
+        import pyarrow.parquet as pq
+        self.pq = pq
+        if not append and os.path.exists(path):
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.wrote_schema = append
+        self._finish_compaction()
+
+    def _parts(self):
+        return sorted(name for name in os.listdir(self.path)
+                      if name.startswith("part-") and name.endswith(PARQUET_EXT))
+
+    def _finish_compaction(self):
+        for name in sorted(os.listdir(self.path)):
+            if not name.startswith("_compact-"):
+                continue
+            if not name.endswith(PARQUET_EXT):
+                os.remove(os.path.join(self.path, name))   # merged file never completed
+                continue
+            first, last = (int(v) for v in name[len("_compact-"):-len(PARQUET_EXT)].split("-"))
+            for part in self._parts():
+                if first <= int(part[len("part-"):-len(PARQUET_EXT)]) <= last:
+                    os.remove(os.path.join(self.path, part))
+            os.replace(os.path.join(self.path, name), os.path.join(self.path, f"part-{first:012d}{PARQUET_EXT}"))
+
+    def write(self, df, start=0):
+        # empty frames still get one part (on first write) so the dataset has a schema
+        if len(df) == 0 and self.wrote_schema:
+            return
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        part = os.path.join(self.path, f"part-{start:012d}{PARQUET_EXT}")
+        tmp = part + ".tmp"
+        self.pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp, part)
+        self.wrote_schema = True
+
+    def flush(self):
+        pass
+
+    def compact(self):
+        # groups of adjacent small parts up to COMPACT_ROWS rows; only the part footers are read
+        groups, group, rows = [], [], 0
+        for name in self._parts():
+            n = self.pq.ParquetFile(os.path.join(self.path, name)).metadata.num_rows
+            if n >= COMPACT_ROWS or rows + n > COMPACT_ROWS:
+                groups.append(group)
+                group, rows = [], 0
+                if n >= COMPACT_ROWS:
+                    continue
+            group.append(name)
+            rows += n
+        groups.append(group)
+        for group in groups:
+            if len(group) >= COMPACT_MIN_PARTS:
+                self._merge(group)
+
+    def _merge(self, parts):
+        import pyarrow as pa
+        first, last = (int(p[len("part-"):-len(PARQUET_EXT)]) for p in (parts[0], parts[-1]))
+        tables = [self.pq.read_table(os.path.join(self.path, p)) for p in parts]
+        # the first (possibly empty) part can have null-typed explanation columns
+        table = pa.concat_tables(tables, promote_options="permissive")
+        merged = os.path.join(self.path, f"_compact-{first:012d}-{last:012d}{PARQUET_EXT}")
+        self.pq.write_table(table, merged + ".tmp", row_group_size=ROW_GROUP_SIZE)
+        os.replace(merged + ".tmp", merged)
+        self._finish_compaction()
+
+    def close(self):
+        pass
+
+def open_sink(path, append=False):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if is_parquet(path):
+        return ParquetSink(path, append)
+    return CsvSink(path, append)
+
+class OutputSinks:
+    # processed rows + flagged events; used as a context manager by every pipeline mode
+    # also keeps mergeable health counts and writes them to <output>.health_summary.json
+    # when closed without an error
+    def __init__(self, output_path, append=False):
+        self.output_path = output_path
+        self.processed = open_sink(output_path, append)
+        self.flagged = open_sink(flagged_path(output_path), append)
+        previous = load_health_summary(output_path) if append else None
+        self.health = {name: (previous or {}).get(name, 0) for name in STATUSES}
+
+    def write(self, df, start=0, explanations=None):
+        # start: global packet index of df's first row; explanations (indexed like the
+        # flagged rows of df) are added as columns of the flagged output only
+        self.processed.write(df, start)
+        flagged = df[df["combined_flag"]==1]
+        if explanations is not None:
+            flagged = flagged.join(explanations)
+        self.flagged.write(flagged, start)
+        self.health = merge_counts(self.health, health_counts(df))
+
+    def flush(self):
+        self.processed.flush()
+        self.flagged.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.processed.close()
+        self.flagged.close()
+        # a failed run leaves the last saved summary (and the small parts) alone
+        if exc[0] is None:
+            self.processed.compact()
+            self.flagged.compact()
+            self.save_health()
+
+    def save_health(self):
+        # also called by incremental runs next to each checkpoint, so the summary
+        # matches what a rerun after a failure resumes from
+        tmp = health_path(self.output_path) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.health, f)
+        os.replace(tmp, health_path(self.output_path))
+
+def _parquet_dataset(path):
+    import pyarrow.dataset as ds
+    return ds.dataset(path, format="parquet")
+
+def read_processed(path, columns=None, start_ts=None, end_ts=None):
+    # columns / [start_ts, end_ts] are pushed down to Parquet (projection + row-group
+    # pruning on ts); CSV falls back to a usecols read plus a filter
+    if is_parquet(path):
+        import pyarrow.dataset as ds
+        dataset = _parquet_dataset(path)
+        flt = None
+        if start_ts is not None:
+            flt = ds.field("ts") >= start_ts
+        if end_ts is not None:
+            cond = ds.field("ts") <= end_ts
+            flt = cond if flt is None else flt & cond
+        if columns is not None:
+            columns = [c for c in columns if c in dataset.schema.names]
+        return dataset.to_table(columns=columns, filter=flt).to_pandas()
+    df = pd.read_csv(path, usecols=(lambda c: c in columns) if columns is not None else None)
+    if start_ts is not None:
+        df = df[df["ts"] >= start_ts]
+    if end_ts is not None:
+        df = df[df["ts"] <= end_ts]
+    return df.reset_index(drop=True)
+
+def processed_ts_range(path):
+    # (min_ts, max_ts) from Parquet row-group statistics, without reading any data pages
+    if not is_parquet(path):
+        ts = pd.read_csv(path, usecols=["ts"])["ts"]
+        return (int(ts.min()), int(ts.max())) if len(ts) else (None, None)
+    lo, hi = None, None
+    for frag in _parquet_dataset(path).get_fragments():
+        md = frag.metadata
+        idx = md.schema.to_arrow_schema().get_field_index("ts")
+        for rg in range(md.num_row_groups):
+            stats = md.row_group(rg).column(idx).statistics
+            if stats is None or not stats.has_min_max:
+                continue
+            lo = stats.min if lo is None else min(lo, stats.min)
+            hi = stats.max if hi is None else max(hi, stats.max)
+    return lo, hi
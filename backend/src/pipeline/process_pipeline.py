@@ -1,55 +1,315 @@
 
-import argparse, os, joblib, numpy as np, pandas as pd
-from src.telemetry.generator import read_bin
-from src.ai.anomaly_detector import AnomalyDetector
+import argparse, json, os, time, joblib, numpy as np, pandas as pd
+from contextlib import nullcontext
+from src.telemetry.generator import read_bin, read_packets, packets_to_df, PACKET_SIZE
+from src.telemetry.store import TelemetryStore
+from src.ai.anomaly_detector import ParallelScorer
+from src.ai.model_registry import get_detector
+from src.pipeline.output_store import OutputSinks, flagged_path, write_run_stats, save_feature_stats
+from src.ai.explain import feature_moments, merge_feature_moments, explain_flagged
+from src.telemetry.metrics import Counter, Histogram, StageTimer
+from src.ai.battery_residual import LR_WINDOW, THRESHOLD_METHODS, predictions_and_residuals, residual_flags
 
 FEATURES = ["battery_v","solar_i","temp","cpu"] + [f"extra{i}" for i in range(8)]
 
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "time per pipeline stage (per chunk in chunked modes)")
+ROWS = Counter("pipeline_rows_total", "telemetry rows processed by the pipeline")
+
 def rule_checks(df):
     # simple rule-based severity flags
     return ((df["battery_v"] < 3.2) | (df["temp"] > 70) | (df["comm"]==2)).astype(int)
 
-def run_pipeline(input_path="data/telemetry.bin", output_csv="data/processed.csv", model_dir="model"):
+def load_detector(model_dir="model"):
+    # current registered version, cached per process
+    return get_detector(model_dir)
+
+def open_scorer(detector, workers=1):
+    # the detector itself, or a process pool scoring row shards across `workers` processes
+    if workers and workers > 1:
+        return ParallelScorer(detector, workers)
+    return nullcontext(detector)
+
+def apply_flags(df, scorer, lr_flags, timer=None, lr_pred=None):
+    # iso + rule stages are row-local, so they score a whole file or a single chunk alike;
+    # scorer is an AnomalyDetector or a ParallelScorer. lr_pred (LR battery prediction
+    # per row, NaN without a full window) is stored for the dashboard overlay.
+    timer = timer or StageTimer()
+    with timer.stage("predict_iso"):
+        X = df[FEATURES].fillna(0.0).values
+        iso_flags, iso_scores = scorer.predict_iso(X)
+    df["iso_flag"] = iso_flags
+    df["iso_score"] = iso_scores
+    df["lr_batt_flag"] = lr_flags
+    df["lr_batt_pred"] = np.nan if lr_pred is None else lr_pred
+    with timer.stage("rule_checks"):
+        df["rule_flag"] = rule_checks(df)
+    df["combined_flag"] = ((df["rule_flag"]==1) | (df["iso_flag"]==1) | (df["lr_batt_flag"]==1)).astype(int)
+    return df
+
+def read_input(input_path, start_ts=None, end_ts=None):
+    # a flat packet file, or a TelemetryStore directory queried by time range
+    if os.path.isdir(input_path):
+        return TelemetryStore(input_path).query(start_ts, end_ts)
     df = read_bin(input_path)
+    if not df.empty and (start_ts is not None or end_ts is not None):
+        lo = df["ts"].min() if start_ts is None else start_ts
+        hi = df["ts"].max() if end_ts is None else end_ts
+        df = df[df["ts"].between(lo, hi)].reset_index(drop=True)
+    return df
+
+def finish_run(timer, mode, input_path, output_path, rows):
+    # per-run stats next to the outputs (run_stats.json) plus the shared row counter
+    ROWS.inc(rows, mode=mode)
+    stats = {"mode": mode, "input": input_path, "output": output_path,
+             "finished": int(time.time()), **timer.summary(rows)}
+    write_run_stats(output_path, stats)
+    return stats
+
+def run_pipeline(input_path="data/telemetry.bin", output_csv="data/processed.csv", model_dir="model", chunk_size=None, workers=1,
+                 lr_threshold="global", start_ts=None, end_ts=None):
+    if chunk_size:
+        if lr_threshold != "global":
+            raise ValueError("Streaming mode only supports the global LR threshold")
+        if os.path.isdir(input_path) or start_ts is not None or end_ts is not None:
+            raise ValueError("Streaming mode reads a whole flat packet file")
+        return run_pipeline_streaming(input_path, output_csv, model_dir, chunk_size, workers)
+    timer = StageTimer(STAGE_SECONDS)
+    with timer.stage("read"):
+        df = read_input(input_path, start_ts, end_ts)
     if df.empty:
         print("No telemetry found")
         return
-    detector = AnomalyDetector(model_path=os.path.join(model_dir,"isoforest.joblib"),
-                               scaler_path=os.path.join(model_dir,"scaler.joblib"),
-                               lr_path=os.path.join(model_dir,"lr_battery.joblib"))
-    X = df[FEATURES].fillna(0.0).values
-    iso_flags, iso_scores = detector.predict_iso(X)
-    df["iso_flag"] = iso_flags
-    df["iso_score"] = iso_scores
+    with timer.stage("load_models"):
+        detector = load_detector(model_dir)
     # simple LR battery residual detection using sliding window
-    win = 5
-    batt = df["battery_v"].fillna(method="ffill").values
-    lr_flags = np.zeros(len(df), dtype=int)
-    if detector.lr is not None and len(batt) > win+1:
-        Xw, yw = [], []
-        for i in range(len(batt)-win-1):
-            Xw.append(batt[i:i+win])
-            yw.append(batt[i+win])
-        Xw = np.array(Xw)
-        preds = detector.lr.predict(Xw)
-        residuals = np.abs(np.array(yw) - preds)
-        thr = residuals.mean() + 3*residuals.std()
-        for i, r in enumerate(residuals):
-            if r > thr:
-                lr_flags[win + i] = 1
-    df["lr_batt_flag"] = lr_flags
-    df["rule_flag"] = rule_checks(df)
-    df["combined_flag"] = ((df["rule_flag"]==1) | (df["iso_flag"]==1) | (df["lr_batt_flag"]==1)).astype(int)
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-    df.to_csv(output_csv, index=False)
-    # save flagged events separately
-    df[df["combined_flag"]==1].to_csv(os.path.join(os.path.dirname(output_csv),"flagged_events.csv"), index=False)
+    win = LR_WINDOW
+    with timer.stage("lr_residual"):
+        batt = df["battery_v"].ffill().values
+        lr_flags = np.zeros(len(df), dtype=int)
+        lr_pred = np.full(len(df), np.nan)
+        if detector.lr is not None and len(batt) > win+1:
+            pred, residuals = predictions_and_residuals(batt, detector.lr, len(batt)-win-1)
+            lr_flags[win:win + len(residuals)] = residual_flags(residuals, lr_threshold)
+            lr_pred[win:win + len(pred)] = pred
+    with open_scorer(detector, workers) as scorer:
+        apply_flags(df, scorer, lr_flags, timer, lr_pred)
+    with timer.stage("explain"):
+        moments = feature_moments(df[FEATURES].fillna(0.0).to_numpy())
+        explanations = explain_flagged(df, FEATURES, moments, detector.compiled)
+    # processed rows + flagged events separately (CSV or Parquet by extension)
+    with timer.stage("write"), OutputSinks(output_csv) as sinks:
+        sinks.write(df, explanations=explanations)
+    save_feature_stats(output_csv, FEATURES, moments)
+    finish_run(timer, "batch", input_path, output_csv, len(df))
     print("Processed", len(df), "rows. Flags saved to", output_csv)
 
+def merge_moments(moments, res):
+    # merge a chunk of residuals into running (count, mean, m2) moments (Chan et al.),
+    # so the threshold matches residuals.mean()/std() over everything merged so far
+    count, mean, m2 = moments
+    if len(res) == 0:
+        return moments
+    c_mean = res.mean()
+    c_m2 = ((res - c_mean) ** 2).sum()
+    delta = c_mean - mean
+    total = count + len(res)
+    mean += delta * len(res) / total
+    m2 += c_m2 + delta ** 2 * count * len(res) / total
+    return total, mean, m2
+
+def moments_threshold(moments):
+    count, mean, m2 = moments
+    return mean + 3*np.sqrt(m2 / count)
+
+def _iter_battery_chunks(input_path, n_total, chunk_size, first=0, tail=None, win=LR_WINDOW):
+    # yields (start, g0, batt, packets): batt is the forward-filled battery series of the
+    # chunk prefixed with the last `win` values of the previous one (g0 = global index of
+    # batt[0]), so every window that straddles a chunk boundary is still seen exactly once
+    tail = np.empty(0) if tail is None else np.asarray(tail, dtype=np.float64)
+    for start in range(first, n_total, chunk_size):
+        packets = read_packets(input_path, offset=start*PACKET_SIZE, count=chunk_size)
+        batt = np.concatenate([tail, packets["battery_v"].astype(np.float64)])
+        batt = pd.Series(batt).ffill().values
+        yield start, start - len(tail), batt, packets
+        tail = batt[-win:]
+
+def run_pipeline_streaming(input_path="data/telemetry.bin", output_csv="data/processed.csv", model_dir="model", chunk_size=100_000, workers=1):
+    # bounded-memory variant of run_pipeline: two passes over fixed-size packet chunks.
+    # pass 1 only accumulates LR residual statistics for the global 3-sigma threshold,
+    # pass 2 scores each chunk and appends it to the outputs.
+    n_total = os.path.getsize(input_path) // PACKET_SIZE
+    if n_total == 0:
+        print("No telemetry found")
+        return
+    timer = StageTimer(STAGE_SECONDS)
+    with timer.stage("load_models"):
+        detector = load_detector(model_dir)
+    win = LR_WINDOW
+    use_lr = detector.lr is not None and n_total > win+1
+
+    def chunk_residuals(g0, batt):
+        # (predictions, residuals); like the batch path, only targets with global
+        # index <= n_total-2 are scored
+        n = min(len(batt) - win, n_total - 1 - g0 - win)
+        return predictions_and_residuals(batt, detector.lr, n)
+
+    # pass 1: LR residual moments and the per-feature moments the explanations use
+    thr = None
+    moments = (0, 0.0, 0.0)
+    feat_moments = (0, np.zeros(len(FEATURES)), np.zeros(len(FEATURES)))
+    for _, g0, batt, packets in _iter_battery_chunks(input_path, n_total, chunk_size):
+        with timer.stage("moments"):
+            if use_lr:
+                moments = merge_moments(moments, chunk_residuals(g0, batt)[1])
+            X = packets_to_df(packets, FEATURES).fillna(0.0).to_numpy()
+            feat_moments = merge_feature_moments(feat_moments, feature_moments(X))
+    if use_lr:
+        thr = moments_threshold(moments)
+
+    with open_scorer(detector, workers) as scorer, OutputSinks(output_csv) as sinks:
+        for start, g0, batt, packets in _iter_battery_chunks(input_path, n_total, chunk_size):
+            with timer.stage("read"):
+                df = packets_to_df(packets)
+                df.index = pd.RangeIndex(start, start + len(df))
+            with timer.stage("lr_residual"):
+                lr_flags = np.zeros(len(df), dtype=int)
+                lr_pred = np.full(len(df), np.nan)
+                if use_lr:
+                    pred, res = chunk_residuals(g0, batt)
+                    first = g0 + win - start
+                    lr_flags[first:first + len(res)] = (res > thr).astype(int)
+                    lr_pred[first:first + len(pred)] = pred
+            apply_flags(df, scorer, lr_flags, timer, lr_pred)
+            with timer.stage("explain"):
+                explanations = explain_flagged(df, FEATURES, feat_moments, detector.compiled)
+            with timer.stage("write"):
+                sinks.write(df, start, explanations)
+            del packets, df
+    save_feature_stats(output_csv, FEATURES, feat_moments)
+    finish_run(timer, "chunked", input_path, output_csv, n_total)
+    print("Processed", n_total, "rows. Flags saved to", output_csv)
+
+CHECKPOINT_FORMAT = 3   # bumped when the output columns or checkpoint state change
+
+def checkpoint_path_for(output_csv):
+    return os.path.splitext(output_csv)[0] + ".checkpoint.json"
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path, state):
+    # write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def _checkpoint_valid(state, input_path, output_csv):
+    # the archive must still contain the packet we stopped at, unchanged, and the outputs
+    # must have the current column layout (appending new columns would break the CSV)
+    if state is None or state.get("input") != os.path.abspath(input_path):
+        return False
+    if state.get("format") != CHECKPOINT_FORMAT:
+        return False
+    if not (os.path.exists(output_csv) and os.path.exists(flagged_path(output_csv))):
+        return False
+    offset = state["offset"]
+    if offset == 0:
+        return True
+    if os.path.getsize(input_path) < offset:
+        return False
+    last = read_packets(input_path, offset=offset - PACKET_SIZE, count=1)
+    return len(last) == 1 and int(last["ts"][0]) == state["last_ts"]
+
+def run_pipeline_incremental(input_path="data/telemetry.bin", output_csv="data/processed.csv", model_dir="model",
+                             checkpoint_path=None, chunk_size=100_000, workers=1):
+    # score only the packets appended since the last run and append their results.
+    # the checkpoint keeps the byte offset / last ts reached, the LR window tail and the
+    # running residual moments, so a run costs O(new packets) rather than O(archive).
+    # unlike the batch path every row with a full LR window is scored (including the
+    # newest one), and the LR threshold is taken over all residuals seen so far.
+    if os.path.isdir(input_path):
+        raise ValueError("Incremental mode reads a flat packet file")
+    checkpoint_path = checkpoint_path or checkpoint_path_for(output_csv)
+    state = load_checkpoint(checkpoint_path)
+    if not _checkpoint_valid(state, input_path, output_csv):
+        state = {"format": CHECKPOINT_FORMAT, "input": os.path.abspath(input_path), "offset": 0, "last_ts": None,
+                 "rows": 0, "batt_tail": [], "lr_moments": [0, 0.0, 0.0],
+                 "feature_moments": [0, [0.0]*len(FEATURES), [0.0]*len(FEATURES)]}
+    n_total = os.path.getsize(input_path) // PACKET_SIZE
+    first = state["offset"] // PACKET_SIZE
+    if n_total <= first:
+        print("No new telemetry since last run")
+        return
+    timer = StageTimer(STAGE_SECONDS)
+    with timer.stage("load_models"):
+        detector = load_detector(model_dir)
+    win = LR_WINDOW
+    fresh = first == 0
+    moments = tuple(state["lr_moments"])
+    count, mean, m2 = state["feature_moments"]
+    feat_moments = (count, np.asarray(mean), np.asarray(m2))
+    with open_scorer(detector, workers) as scorer, OutputSinks(output_csv, append=not fresh) as sinks:
+        for start, g0, batt, packets in _iter_battery_chunks(input_path, n_total, chunk_size,
+                                                             first=first, tail=state["batt_tail"]):
+            with timer.stage("read"):
+                df = packets_to_df(packets)
+                df.index = pd.RangeIndex(start, start + len(df))
+            with timer.stage("lr_residual"):
+                lr_flags = np.zeros(len(df), dtype=int)
+                lr_pred = np.full(len(df), np.nan)
+                n = len(batt) - win
+                if detector.lr is not None and n > 0:
+                    pred, res = predictions_and_residuals(batt, detector.lr, n)
+                    moments = merge_moments(moments, res)
+                    first_target = g0 + win - start
+                    lr_flags[first_target:] = (res > moments_threshold(moments)).astype(int)
+                    lr_pred[first_target:] = pred
+            apply_flags(df, scorer, lr_flags, timer, lr_pred)
+            # like the LR threshold, explanations use the statistics of every row so far
+            with timer.stage("explain"):
+                feat_moments = merge_feature_moments(feat_moments, feature_moments(df[FEATURES].fillna(0.0).to_numpy()))
+                explanations = explain_flagged(df, FEATURES, feat_moments, detector.compiled)
+            with timer.stage("write"):
+                sinks.write(df, start, explanations)
+                sinks.flush()
+            state.update(offset=(start + len(df)) * PACKET_SIZE, last_ts=int(df["ts"].iloc[-1]),
+                         rows=start + len(df), batt_tail=[float(v) for v in batt[-win:]],
+                         lr_moments=[int(moments[0]), float(moments[1]), float(moments[2])],
+                         feature_moments=[int(feat_moments[0]), np.asarray(feat_moments[1]).tolist(),
+                                          np.asarray(feat_moments[2]).tolist()])
+            with timer.stage("checkpoint"):
+                sinks.save_health()
+                save_checkpoint(checkpoint_path, state)
+            del packets, df
+    save_feature_stats(output_csv, FEATURES, feat_moments)
+    finish_run(timer, "incremental", input_path, output_csv, n_total - first)
+    print("Processed", n_total - first, "new rows. Flags appended to", output_csv)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", default="data/telemetry.bin")
     parser.add_argument("--output", default="data/processed.csv")
     parser.add_argument("--model_dir", default="model")
+    parser.add_argument("--chunk_size", type=int, default=None,
+                        help="stream the input in chunks of this many packets (bounded memory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process packets appended since the last checkpointed run")
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="score IsolationForest shards in this many processes")
+    parser.add_argument("--lr_threshold", choices=THRESHOLD_METHODS, default="global",
+                        help="battery residual threshold (batch mode only for rolling/robust)")
+    parser.add_argument("--start_ts", type=int, default=None,
+                        help="only process packets with ts >= start_ts (batch mode; --input may be a store directory)")
+    parser.add_argument("--end_ts", type=int, default=None)
     args = parser.parse_args()
-    run_pipeline(args.input, args.output, args.model_dir)
+    if args.incremental:
+        run_pipeline_incremental(args.input, args.output, args.model_dir, args.checkpoint,
+                                 args.chunk_size or 100_000, args.workers)
+    else:
+        run_pipeline(args.input, args.output, args.model_dir, args.chunk_size, args.workers, args.lr_threshold,
+                     args.start_ts, args.end_ts)
@@ -0,0 +1,213 @@
+
+import argparse, glob, hashlib, heapq, json, os, sys, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Add project root to sys.path so the module can run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.ai.model_registry import ModelRegistry
+from src.scheduler.locks import acquire_lock, lock_path_for, release_lock
+
+# Backfill job queue: (re)processes every capture file or store segment matching the
+# input globs whose output is missing, stale (input changed) or was made by another
+# model version. Jobs run in a bounded process pool, highest priority first (newest
+# input by default); each holds a lock on a file next to its output (see locks.py), so
+# two schedulers never process the same capture at once. A failed job is retried with
+# exponential backoff up to max_attempts. Progress goes to status.json under the output root after every
+# state change (`--status` prints it).
+#
+# Each input gets its own output directory (<output_root>/<input name>-<path hash>/
+# processed.parquet) because a run also writes the flagged events and run_stats.json
+# next to its output; hashing the full input path keeps a capture and a store segment
+# with the same file name apart.
+STATUS_FILE = "status.json"
+DEFAULT_INPUTS = ("data/captures/*.bin", "data/store/seg-*.bin")
+BACKOFF_BASE_SEC = 30.0
+BACKOFF_MAX_SEC = 3600.0
+
+def output_for(input_path, output_root):
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    key = hashlib.sha1(os.path.abspath(input_path).encode()).hexdigest()[:12]
+    return os.path.join(output_root, f"{name}-{key}", "processed.parquet")
+
+def load_status(output_root):
+    path = os.path.join(output_root, STATUS_FILE)
+    if not os.path.exists(path):
+        return {"jobs": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_status(output_root, status):
+    os.makedirs(output_root, exist_ok=True)
+    status["updated"] = time.time()
+    path = os.path.join(output_root, STATUS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def discover(patterns, output_root, status, model_version, min_age=60.0, now=None):
+    # [(priority, input path)] of pending inputs. Inputs modified within the last
+    # min_age seconds (a capture still being written, the open store segment) wait for
+    # a later run; so do failed jobs whose backoff has not expired.
+    now = time.time() if now is None else now
+    pending = []
+    for path in sorted({p for pattern in patterns for p in glob.glob(pattern)}):
+        st = os.stat(path)
+        if now - st.st_mtime < min_age:
+            continue
+        job = status["jobs"].get(os.path.abspath(path), {})
+        done = (job.get("status") == "done" and job.get("model_version") == model_version
+                and job.get("input_size") == st.st_size and job.get("input_mtime") == st.st_mtime
+                and os.path.exists(job.get("output", "")))
+        if done or (job.get("status") == "failed" and job.get("retry_at", 0) > now):
+            continue
+        if job.get("status") == "dead" and job.get("target") == [model_version, st.st_size, st.st_mtime]:
+            continue   # gave up on this input and model; a change of either is retried
+        pending.append((st.st_mtime, path))
+    return pending
+
+class JobLocked(RuntimeError):
+    pass
+
+def _run_job(input_path, output_path, model_dir, chunk_size):
+    # runs in a pool worker: the chunked pipeline under the job's lock
+    from src.pipeline.process_pipeline import run_pipeline_streaming, load_detector
+    from src.telemetry.generator import PACKET_SIZE
+    lock = acquire_lock(lock_path_for(output_path))
+    if lock is None:
+        raise JobLocked(f"{output_path} is locked by another process")
+    try:
+        t0 = time.time()
+        run_pipeline_streaming(input_path, output_path, model_dir, chunk_size)
+        return {"rows": os.path.getsize(input_path) // PACKET_SIZE, "seconds": round(time.time() - t0, 3),
+                "model_version": load_detector(model_dir).version}
+    finally:
+        release_lock(lock)
+
+def summarize(status):
+    # counts per job status plus rows / throughput of the finished jobs
+    counts = {}
+    rows, seconds = 0, 0.0
+    for job in status["jobs"].values():
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+        if job["status"] == "done":
+            rows += job.get("rows", 0)
+            seconds += job.get("seconds", 0.0)
+    return {"jobs": counts, "rows_done": rows,
+            "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None}
+
+def run_backfill(patterns=DEFAULT_INPUTS, output_root="data/backfill", model_dir="model", jobs=2,
+                 chunk_size=1_000_000, max_attempts=3, backoff=BACKOFF_BASE_SEC, min_age=60.0,
+                 oldest_first=False, wait_retries=True):
+    # process every pending input; with wait_retries, failed jobs are retried (after
+    # their backoff) within this call, otherwise on the next call. Returns the summary,
+    # or None when another backfill run holds output_root.
+    run_lock = acquire_lock(os.path.join(output_root, "backfill.lock"))
+    if run_lock is None:
+        print(f"[backfill] another run is active on {output_root}, skipping")
+        return None
+    try:
+        return _run_backfill(patterns, output_root, model_dir, jobs, chunk_size, max_attempts, backoff,
+                             min_age, oldest_first, wait_retries)
+    finally:
+        release_lock(run_lock)
+
+def _run_backfill(patterns, output_root, model_dir, jobs, chunk_size, max_attempts, backoff, min_age,
+                  oldest_first, wait_retries):
+    model_version = ModelRegistry(model_dir).current_version()
+    status = load_status(output_root)
+    status["model_version"] = model_version
+    queue = []   # heap of (priority, seq, input path)
+    seq = 0
+
+    def enqueue(priority, path):
+        nonlocal seq
+        heapq.heappush(queue, (priority if oldest_first else -priority, seq, path))
+        seq += 1
+
+    for mtime, path in discover(patterns, output_root, status, model_version, min_age):
+        job = status["jobs"].setdefault(os.path.abspath(path), {"attempts": 0})
+        st = os.stat(path)
+        # a new model version or a changed input starts the attempt count over
+        target = [model_version, st.st_size, st.st_mtime]
+        if job.get("target") != target:
+            job["attempts"] = 0
+        job.update(input=path, output=output_for(path, output_root), status="queued", target=target,
+                   input_size=st.st_size, input_mtime=st.st_mtime)
+        enqueue(mtime, path)
+    save_status(output_root, status)
+    if not queue:
+        return summarize(status)
+
+    retries = []   # heap of (retry_at, priority, input path)
+    running = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while queue or running or (wait_retries and retries):
+            now = time.time()
+            while retries and retries[0][0] <= now:
+                _, priority, path = heapq.heappop(retries)
+                enqueue(priority, path)
+            # only `jobs` futures in flight, so the heap order decides what runs next
+            while queue and len(running) < jobs:
+                _, _, path = heapq.heappop(queue)
+                job = status["jobs"][os.path.abspath(path)]
+                job.update(status="running", started=time.time(), attempts=job["attempts"] + 1)
+                running[pool.submit(_run_job, path, job["output"], model_dir, chunk_size)] = path
+                save_status(output_root, status)
+            if not running:
+                time.sleep(max(0.0, min(r[0] for r in retries) - time.time()))
+                continue
+            timeout = max(0.0, retries[0][0] - time.time()) if retries and wait_retries else None
+            finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = running.pop(future)
+                job = status["jobs"][os.path.abspath(path)]
+                job["finished"] = time.time()
+                try:
+                    job.update(status="done", error=None, retry_at=None, **future.result())
+                except JobLocked as e:
+                    # someone else is on it: not an attempt, looked at again next run
+                    job.update(status="locked", error=str(e), attempts=job["attempts"] - 1)
+                except Exception as e:
+                    job["error"] = f"{type(e).__name__}: {e}"
+                    if job["attempts"] >= max_attempts:
+                        job["status"] = "dead"
+                    else:
+                        delay = min(BACKOFF_MAX_SEC, backoff * 2 ** (job["attempts"] - 1))
+                        job.update(status="failed", retry_at=time.time() + delay)
+                        if wait_retries:
+                            heapq.heappush(retries, (job["retry_at"], job["input_mtime"], path))
+                print(f"[backfill] {path}: {job['status']}" + (f" ({job['error']})" if job["status"] != "done" else ""))
+                save_status(output_root, status)
+    return summarize(status)
+
+def format_status(status):
+    lines = [f"model version: {status.get('model_version')}", json.dumps(summarize(status))]
+    for job_id, job in sorted(status["jobs"].items()):
+        line = f"{job['status']:8} attempts={job.get('attempts', 0)} {job_id}"
+        if job["status"] == "done":
+            line += f" rows={job.get('rows')} {job.get('seconds')}s version={job.get('model_version')}"
+        elif job.get("error"):
+            line += f" error={job['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inputs", default=",".join(DEFAULT_INPUTS), help="comma-separated globs of captures / store segments")
+    parser.add_argument("--output_root", default="data/backfill")
+    parser.add_argument("--model_dir", default="model")
+    parser.add_argument("--jobs", type=int, default=2, help="captures processed in parallel")
+    parser.add_argument("--chunk_size", type=int, default=1_000_000)
+    parser.add_argument("--max_attempts", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=BACKOFF_BASE_SEC, help="first retry delay, doubled per attempt")
+    parser.add_argument("--min_age", type=float, default=60.0, help="skip inputs modified in the last N seconds")
+    parser.add_argument("--oldest_first", action="store_true")
+    parser.add_argument("--status", action="store_true", help="print the job status and exit")
+    args = parser.parse_args()
+    if args.status:
+        print(format_status(load_status(args.output_root)))
+    else:
+        summary = run_backfill([p for p in args.inputs.split(",") if p], args.output_root, args.model_dir, args.jobs,
+                               args.chunk_size, args.max_attempts, args.backoff, args.min_age, args.oldest_first)
+        print(json.dumps(summary))
@@ -0,0 +1,40 @@
+import os
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+# Non-blocking exclusive locks on a file next to a job's output, shared by the backfill
+# queue and the nightly scheduler. flock on POSIX, msvcrt.locking (first byte) on
+# Windows; either way the OS releases the lock when the holder exits, so a crashed run
+# never leaves a stale lock behind.
+
+def lock_path_for(output_path):
+    return output_path.rstrip("/") + ".lock"
+
+def acquire_lock(path):
+    # returns the open lock file (pass it to release_lock), or None when another
+    # process holds the lock. The file itself is kept: removing it would let the next
+    # run lock a new file while a holder of the old one is still running
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    f = open(path, "a")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except (BlockingIOError, PermissionError):
+        f.close()
+        return None
+    return f
+
+def release_lock(lock):
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    else:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+    lock.close()
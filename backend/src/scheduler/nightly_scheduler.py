@@ -1,12 +1,46 @@
 
-import time
+import argparse, time
+from datetime import datetime
 from apscheduler.schedulers.blocking import BlockingScheduler
-from src.pipeline.process_pipeline import run_pipeline
+from src.pipeline.process_pipeline import run_pipeline_incremental
+from src.scheduler.locks import acquire_lock, lock_path_for, release_lock
+
+def locked_incremental(input_path, output_path, model_dir, workers=1):
+    # skips the run while another process (e.g. a second scheduler) holds the output
+    lock = acquire_lock(lock_path_for(output_path))
+    if lock is None:
+        print(f"{output_path} is locked by another run, skipping")
+        return
+    try:
+        run_pipeline_incremental(input_path, output_path, model_dir, workers=workers)
+    finally:
+        release_lock(lock)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to score each run (see process_pipeline --workers)")
+    parser.add_argument("--backfill", nargs="?", const="", default=None,
+                        help="also reprocess pending captures / store segments (comma-separated globs, "
+                             "default: backfill.py's DEFAULT_INPUTS)")
+    parser.add_argument("--backfill_jobs", type=int, default=2, help="captures processed in parallel by the backfill job")
+    parser.add_argument("--backfill_minutes", type=int, default=60)
+    args = parser.parse_args()
     scheduler = BlockingScheduler()
     # For demo: run every 1 minute. Change to cron for real nightly, e.g. scheduler.add_job(..., 'cron', hour=3)
-    scheduler.add_job(run_pipeline, 'interval', minutes=1, args=["data/telemetry.bin","data/processed.csv","model"])
+    # Incremental: each run only scores packets appended since the last checkpoint (data/processed.checkpoint.json)
+    # and adds them as new parts of the Parquet dataset read by the UI
+    # max_instances=1 + coalesce: a run that overruns the interval is not started twice
+    scheduler.add_job(locked_incremental, 'interval', minutes=1, args=["data/telemetry.bin","data/processed.parquet","model"],
+                      kwargs={"workers": args.workers}, max_instances=1, coalesce=True)
+    if args.backfill is not None:
+        # imported only when enabled: the backfill queue pulls in the model registry
+        from src.scheduler.backfill import DEFAULT_INPUTS, run_backfill
+        patterns = [p for p in args.backfill.split(",") if p] or list(DEFAULT_INPUTS)
+        # first pass right away, then picks up new captures / a new model version every interval
+        scheduler.add_job(run_backfill, 'interval', minutes=args.backfill_minutes, next_run_time=datetime.now(),
+                          args=[patterns],
+                          kwargs={"jobs": args.backfill_jobs}, max_instances=1, coalesce=True)
     print("Scheduler started (demo: runs every minute). Ctrl+C to stop.")
     try:
         scheduler.start()
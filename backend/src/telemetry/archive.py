@@ -0,0 +1,290 @@
+
+import argparse, os, struct, sys, zlib
+import numpy as np
+
+# Add project root to sys.path so the module can run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.telemetry.generator import PACKET_DTYPE, PACKET_SIZE, FIELD_NAMES, concat_packets, packets_to_df, read_packets
+
+# Compressed columnar packet archive. Packets are stored in blocks of `block_size` rows;
+# inside a block every field is its own compressed section: ts as u32 deltas (wrapping,
+# so any ts sequence round-trips), every multi-byte field byte-shuffled (all first bytes,
+# then all second bytes, ...) so the slowly changing high bytes compress well. Sections
+# are compressed with zstd or lz4 when installed, else zlib.
+#
+# File: header (magic, codec, block size) then blocks, each with its own header
+# (rows, min/max ts, anomaly count, section sizes). The same per-block header fields go
+# to a sidecar .idx file, so a query reads the index, skips blocks by ts range or
+# anomaly count and only decompresses the sections of the columns it needs.
+MAGIC = b"TPA1"
+HEADER_FMT = "<4sBI"                             # magic, codec id, block size
+BLOCK_FMT = "<IIII" + "I" * len(FIELD_NAMES)     # rows, min_ts, max_ts, anomalies, section sizes
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+BLOCK_HEADER_SIZE = struct.calcsize(BLOCK_FMT)
+BLOCK_ROWS = 65536
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("rows", "<u4"), ("min_ts", "<u4"),
+                        ("max_ts", "<u4"), ("anomalies", "<u4")])
+CODECS = ("zlib", "zstd", "lz4")   # position = codec id in the file header
+
+def available_codec():
+    # best installed codec; zlib is always there
+    for name, module in (("zstd", "zstandard"), ("lz4", "lz4.frame")):
+        try:
+            __import__(module)
+            return name
+        except ImportError:
+            pass
+    return "zlib"
+
+def _codec_funcs(name):
+    # (compress, decompress) for a codec name
+    if name == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress
+    if name == "lz4":
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    if name == "zlib":
+        return (lambda b: zlib.compress(b, 6)), zlib.decompress
+    raise ValueError(f"Unknown codec: {name}")
+
+def rule_mask(packets):
+    # rule-based anomalies, same thresholds as process_pipeline.rule_checks
+    return (packets["battery_v"] < 3.2) | (packets["temp"] > 70) | (packets["comm"] == 2)
+
+def _shuffle(col):
+    # byte-shuffle: (n, itemsize) bytes -> itemsize planes of n bytes
+    return np.ascontiguousarray(col).view(np.uint8).reshape(len(col), col.dtype.itemsize).T.tobytes()
+
+def _unshuffle(buf, dtype, n):
+    return np.frombuffer(buf, dtype=np.uint8).reshape(dtype.itemsize, n).T.copy().view(dtype).ravel()
+
+def encode_block(packets, anomalies, compress):
+    # one block of PACKET_DTYPE rows -> bytes (block header + compressed sections)
+    ts = packets["ts"].astype(np.uint32)
+    sections = []
+    for name in FIELD_NAMES:
+        col = packets[name]
+        if name == "ts":
+            col = np.diff(ts, prepend=np.uint32(0)).astype(">u4")
+        sections.append(compress(_shuffle(col)))
+    header = struct.pack(BLOCK_FMT, len(packets), int(ts.min()), int(ts.max()), int(anomalies),
+                         *[len(s) for s in sections])
+    return header + b"".join(sections)
+
+class PacketArchive:
+    def __init__(self, path, block_size=BLOCK_ROWS, codec=None):
+        # block_size and codec only apply when the archive is created; an existing
+        # archive keeps the ones in its header
+        self.path = path
+        self.index_path = path + ".idx"
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            with open(path, "rb") as f:
+                magic, codec_id, block_size = struct.unpack(HEADER_FMT, f.read(HEADER_SIZE))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a packet archive")
+            codec = CODECS[codec_id]
+        self.codec = codec or available_codec()
+        self.block_size = block_size
+        self.compress, self.decompress = _codec_funcs(self.codec)
+
+    def _create(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(HEADER_FMT, MAGIC, CODECS.index(self.codec), self.block_size))
+        open(self.index_path, "wb").close()
+
+    def append(self, packets, anomalies=None):
+        # packets: PACKET_DTYPE array; anomalies: per-row bool mask (default rule_mask),
+        # only its per-block count is kept. Returns the number of blocks written.
+        if len(packets) == 0:
+            return 0
+        if not os.path.exists(self.path):
+            self._create()
+        else:
+            # drop a partly written trailing block (e.g. from a crash) before appending
+            end = self._end(self.index())
+            if os.path.getsize(self.path) > end:
+                os.truncate(self.path, end)
+        anomalies = rule_mask(packets) if anomalies is None else np.asarray(anomalies, dtype=bool)
+        entries = np.empty((len(packets) + self.block_size - 1) // self.block_size, dtype=INDEX_DTYPE)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            for i, start in enumerate(range(0, len(packets), self.block_size)):
+                block = packets[start:start + self.block_size]
+                count = int(anomalies[start:start + self.block_size].sum())
+                data = encode_block(block, count, self.compress)
+                f.write(data)
+                ts = block["ts"]
+                entries[i] = (offset, len(block), ts.min(), ts.max(), count)
+                offset += len(data)
+        with open(self.index_path, "ab") as f:
+            entries.tofile(f)
+        return len(entries)
+
+    def index(self):
+        # per-block (offset, rows, min_ts, max_ts, anomalies); rebuilt from the block
+        # headers when the sidecar is missing or behind the archive
+        if not os.path.exists(self.path):
+            return np.empty(0, dtype=INDEX_DTYPE)
+        if os.path.exists(self.index_path):
+            index = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+            if self._end(index) == os.path.getsize(self.path):
+                return index
+        return self.rebuild_index()
+
+    def _end(self, index):
+        # file offset just past the last block in index
+        if not len(index):
+            return HEADER_SIZE
+        with open(self.path, "rb") as f:
+            f.seek(int(index["offset"][-1]))
+            header = f.read(BLOCK_HEADER_SIZE)
+        if len(header) < BLOCK_HEADER_SIZE:
+            return -1
+        return int(index["offset"][-1]) + BLOCK_HEADER_SIZE + sum(struct.unpack(BLOCK_FMT, header)[4:])
+
+    def rebuild_index(self):
+        entries = []
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            offset = HEADER_SIZE
+            while offset + BLOCK_HEADER_SIZE <= size:
+                f.seek(offset)
+                rows, min_ts, max_ts, anomalies, *sizes = struct.unpack(BLOCK_FMT, f.read(BLOCK_HEADER_SIZE))
+                if offset + BLOCK_HEADER_SIZE + sum(sizes) > size:
+                    break   # truncated trailing block
+                entries.append((offset, rows, min_ts, max_ts, anomalies))
+                offset += BLOCK_HEADER_SIZE + sum(sizes)
+        index = np.array(entries, dtype=INDEX_DTYPE)
+        tmp = self.index_path + ".tmp"
+        index.tofile(tmp)
+        os.replace(tmp, self.index_path)
+        return index
+
+    def select_blocks(self, start_ts=None, end_ts=None, flagged_only=False):
+        # index entries of the blocks that can hold matching rows
+        index = self.index()
+        keep = np.ones(len(index), dtype=bool)
+        if start_ts is not None:
+            keep &= index["max_ts"] >= start_ts
+        if end_ts is not None:
+            keep &= index["min_ts"] <= end_ts
+        if flagged_only:
+            keep &= index["anomalies"] > 0
+        return index[keep]
+
+    def _decode(self, f, entry, names):
+        # {field: big-endian column} for the given fields of one block
+        f.seek(int(entry["offset"]))
+        rows, _, _, _, *sizes = struct.unpack(BLOCK_FMT, f.read(BLOCK_HEADER_SIZE))
+        starts = np.concatenate([[0], np.cumsum(sizes)])
+        wanted = set(names) | {"ts"}
+        # ts is the first section; read up to the last wanted one
+        last = max(FIELD_NAMES.index(name) for name in wanted)
+        body = f.read(int(starts[last + 1]))
+        cols = {}
+        for i, name in enumerate(FIELD_NAMES[:last + 1]):
+            if name not in wanted:
+                continue
+            col = _unshuffle(self.decompress(body[starts[i]:starts[i + 1]]), PACKET_DTYPE[name], rows)
+            if name == "ts":
+                col = np.cumsum(col, dtype=np.uint32).astype(">u4")
+            cols[name] = col
+        return cols
+
+    def iter_blocks(self, start_ts=None, end_ts=None, flagged_only=False, columns=None):
+        # yields {field: column} per selected block, rows outside [start_ts, end_ts] dropped
+        names = FIELD_NAMES if columns is None else list(columns)
+        with open(self.path, "rb") as f:
+            for entry in self.select_blocks(start_ts, end_ts, flagged_only):
+                cols = self._decode(f, entry, names)
+                ts = cols["ts"]
+                if (start_ts is not None and entry["min_ts"] < start_ts) or (end_ts is not None and entry["max_ts"] > end_ts):
+                    keep = np.ones(len(ts), dtype=bool)
+                    if start_ts is not None:
+                        keep &= ts >= start_ts
+                    if end_ts is not None:
+                        keep &= ts <= end_ts
+                    cols = {k: v[keep] for k, v in cols.items()}
+                yield {name: cols[name] for name in names}
+
+    def read_packets(self, start_ts=None, end_ts=None, flagged_only=False):
+        # PACKET_DTYPE array of the matching rows (flagged_only keeps whole blocks that
+        # contain at least one anomaly)
+        parts = []
+        for cols in self.iter_blocks(start_ts, end_ts, flagged_only):
+            packets = np.empty(len(cols["ts"]), dtype=PACKET_DTYPE)
+            for name in FIELD_NAMES:
+                packets[name] = cols[name]
+            parts.append(packets)
+        return concat_packets(parts)
+
+    def read(self, start_ts=None, end_ts=None, columns=None, flagged_only=False):
+        # DataFrame like packets_to_df, decompressing only the requested columns
+        names = FIELD_NAMES if columns is None else list(columns)
+        parts = list(self.iter_blocks(start_ts, end_ts, flagged_only, names))
+        packets = np.empty(sum(len(p[names[0]]) for p in parts) if parts else 0,
+                           dtype=[(name, PACKET_DTYPE[name]) for name in names])
+        pos = 0
+        for p in parts:
+            n = len(p[names[0]])
+            for name in names:
+                packets[name][pos:pos + n] = p[name]
+            pos += n
+        return packets_to_df(packets, names)
+
+def bin_to_archive(bin_path, archive_path, block_size=BLOCK_ROWS, codec=None, chunk_size=1_000_000,
+                   anomalies=None):
+    # packet file -> archive (replaced). anomalies: optional per-packet bool array, e.g.
+    # scenario labels != 0 or the pipeline's combined_flag; defaults to rule_mask
+    if os.path.exists(archive_path):
+        os.remove(archive_path)
+    archive = PacketArchive(archive_path, block_size, codec)
+    n_total = os.path.getsize(bin_path) // PACKET_SIZE
+    chunk_size = max(block_size, chunk_size // block_size * block_size)   # whole blocks per chunk
+    for start in range(0, n_total, chunk_size):
+        packets = np.asarray(read_packets(bin_path, offset=start*PACKET_SIZE, count=chunk_size))
+        archive.append(packets, None if anomalies is None else anomalies[start:start + len(packets)])
+    return archive
+
+def archive_to_bin(archive_path, bin_path, start_ts=None, end_ts=None, flagged_only=False):
+    # archive (or the selected part of it) -> packet file; returns packets written
+    archive = PacketArchive(archive_path)
+    os.makedirs(os.path.dirname(bin_path) or ".", exist_ok=True)
+    written = 0
+    with open(bin_path, "wb") as f:
+        for cols in archive.iter_blocks(start_ts, end_ts, flagged_only):
+            packets = np.empty(len(cols["ts"]), dtype=PACKET_DTYPE)
+            for name in FIELD_NAMES:
+                packets[name] = cols[name]
+            packets.tofile(f)
+            written += len(packets)
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="data/telemetry.bin", help=".bin to archive, or archive to extract with --extract")
+    parser.add_argument("--output", default="data/telemetry.tpa")
+    parser.add_argument("--extract", action="store_true", help="archive -> .bin instead of .bin -> archive")
+    parser.add_argument("--block_size", type=int, default=BLOCK_ROWS)
+    parser.add_argument("--codec", choices=CODECS, default=None, help="default: zstd, else lz4, else zlib")
+    parser.add_argument("--labels", action="store_true",
+                        help="count anomalies from the scenario .labels file instead of the rule checks")
+    parser.add_argument("--start_ts", type=int, default=None)
+    parser.add_argument("--end_ts", type=int, default=None)
+    parser.add_argument("--flagged_only", action="store_true", help="with --extract: only blocks with anomalies")
+    args = parser.parse_args()
+    if args.extract:
+        n = archive_to_bin(args.input, args.output, args.start_ts, args.end_ts, args.flagged_only)
+        print(f"Extracted {n} packets to {args.output}")
+    else:
+        anomalies = None
+        if args.labels:
+            from src.telemetry.scenarios import read_labels
+            anomalies = np.asarray(read_labels(args.input)) != 0
+        archive = bin_to_archive(args.input, args.output, args.block_size, args.codec, anomalies=anomalies)
+        size = os.path.getsize(args.output)
+        print(f"Archived {os.path.getsize(args.input) // PACKET_SIZE} packets into {len(archive.index())} blocks "
+              f"({archive.codec}): {os.path.getsize(args.input)} -> {size} bytes")
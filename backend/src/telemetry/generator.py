@@ -8,9 +8,23 @@ PACKET_SIZE = struct.calcsize(PACKET_FMT)
 FIELD_NAMES = ["ts","battery_v","solar_i","temp","cpu","comm","flags",
                "qx","qy","qz","qw"] + [f"extra{i}" for i in range(8)]
 
+# struct codes in PACKET_FMT -> numpy big-endian scalar types
+_STRUCT_TO_NP = {"I": ">u4", "H": ">u2", "B": "u1", "f": ">f4"}
+
+def _packet_dtype(fmt=PACKET_FMT):
+    codes = []
+    for tok in fmt.lstrip("<>!=@").split():
+        count, code = (int(tok[:-1]), tok[-1]) if len(tok) > 1 else (1, tok)
+        codes.extend([_STRUCT_TO_NP[code]] * count)
+    dt = np.dtype(list(zip(FIELD_NAMES, codes)))
+    assert dt.itemsize == struct.calcsize(fmt)
+    return dt
+
+PACKET_DTYPE = _packet_dtype()
+
 def generate_synthetic(n_minutes=1440, sample_interval_sec=60, inject_anoms=False):
     start_ts = int(time.time())
-    timestamps = [start_ts + i*sample_interval_sec for i in range(n_minutes)]
+    timestamps = start_ts + np.arange(n_minutes, dtype=np.int64)*sample_interval_sec
     # simple dynamics
     t = np.arange(n_minutes)
     orbit = np.sin(2*np.pi*t/90)
@@ -38,23 +52,74 @@ def pack_row_to_bytes(row):
     extras = tuple(float(row[f"extra{i}"]) for i in range(8))
     return struct.pack(PACKET_FMT, *vals, *extras)
 
-def save_to_bin(df, path="data/telemetry.bin"):
+# values used when a frame has no column for the field (matches pack_row_to_bytes)
+PACKET_DEFAULTS = {"flags": 0, "qx": 1.0, "qy": 0.0, "qz": 0.0, "qw": 0.0}
+
+def df_to_packets(df):
+    # build one structured array from the frame columns, filling defaults for optional fields
+    packets = np.empty(len(df), dtype=PACKET_DTYPE)
+    for name in FIELD_NAMES:
+        if name in df.columns:
+            col = df[name].to_numpy()
+            if packets.dtype[name].kind != "f":
+                col = col.astype(np.int64)
+            packets[name] = col
+        else:
+            packets[name] = PACKET_DEFAULTS[name]
+    return packets
+
+def concat_packets(parts):
+    # np.concatenate canonicalizes structured dtypes to native byte order, which would
+    # write little-endian packets; keep PACKET_DTYPE so the result can go to disk as is
+    out = np.empty(sum(len(p) for p in parts), dtype=PACKET_DTYPE)
+    pos = 0
+    for p in parts:
+        out[pos:pos + len(p)] = p
+        pos += len(p)
+    return out
+
+def save_to_bin(df, path="data/telemetry.bin", append=False):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab" if append else "wb") as f:
+        df_to_packets(df).tofile(f)
+
+def append_batches_to_bin(batches, path="data/telemetry.bin"):
+    # stream an iterable of DataFrames to disk one batch at a time; returns packets written
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "wb") as f:
-        for _, row in df.iterrows():
-            f.write(pack_row_to_bytes(row))
+    written = 0
+    with open(path, "ab") as f:
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+            df_to_packets(batch).tofile(f)
+            written += len(batch)
+    return written
+
+def read_packets(path="data/telemetry.bin", offset=0, count=None):
+    # zero-copy view of the packet file as a structured array (big-endian fields).
+    # a truncated trailing packet is ignored, same as the old per-packet reader.
+    size = os.path.getsize(path) - offset
+    n = max(0, size // PACKET_SIZE)
+    if count is not None:
+        n = min(n, count)
+    if n == 0:
+        return np.empty(0, dtype=PACKET_DTYPE)
+    return np.memmap(path, dtype=PACKET_DTYPE, mode="r", offset=offset, shape=(n,))
+
+def packets_to_df(packets, columns=None):
+    # widen to native int64/float64 so downstream results match the struct.unpack path
+    columns = FIELD_NAMES if columns is None else list(columns)
+    cols = {}
+    for name in columns:
+        col = packets[name]
+        cols[name] = col.astype(np.float64) if col.dtype.kind == "f" else col.astype(np.int64)
+    return pd.DataFrame(cols, columns=columns)
 
 def read_bin(path="data/telemetry.bin"):
-    rows = []
-    with open(path, "rb") as f:
-        while True:
-            chunk = f.read(PACKET_SIZE)
-            if not chunk or len(chunk) < PACKET_SIZE:
-                break
-            vals = struct.unpack(PACKET_FMT, chunk)
-            row = dict(zip(FIELD_NAMES, vals))
-            rows.append(row)
-    return pd.DataFrame(rows)
+    packets = read_packets(path)
+    if len(packets) == 0:
+        return pd.DataFrame()
+    return packets_to_df(packets)
 
 if __name__ == "__main__":
     df = generate_synthetic(n_minutes=1440, inject_anoms=True)
@@ -0,0 +1,89 @@
+
+from collections import deque
+import numpy as np
+
+# Health status of a telemetry point: critical = a rule violation (battery < 3.2 V,
+# temp > 70 C or comm loss), warning = flagged by the models only, normal otherwise.
+STATUSES = ("critical", "warning", "normal")
+CRITICAL, WARNING, NORMAL = range(3)
+ORBIT_TICKS = 90   # simulator orbit period, in ticks
+
+def classify(battery_v, temp, comm, combined_flag):
+    # vectorized status codes for arrays (or scalars) of point fields
+    rule = (np.asarray(battery_v) < 3.2) | (np.asarray(temp) > 70) | (np.asarray(comm) == 2)
+    return np.where(rule, CRITICAL, np.where(np.asarray(combined_flag) == 1, WARNING, NORMAL))
+
+def health_counts(df):
+    # {"critical", "warning", "normal"} over a processed frame
+    if df.empty:
+        return dict.fromkeys(STATUSES, 0)
+    combined = df.get("combined_flag")
+    if combined is None:
+        combined = np.zeros(len(df), dtype=int)
+    codes = classify(df["battery_v"], df["temp"], df["comm"], np.asarray(combined))
+    counts = np.bincount(codes, minlength=3)
+    return {name: int(c) for name, c in zip(STATUSES, counts)}
+
+def merge_counts(a, b):
+    return {name: a.get(name, 0) + b.get(name, 0) for name in STATUSES}
+
+class _Buckets:
+    # tumbling aggregates keyed by an increasing bucket number; only the newest
+    # `keep` buckets are retained
+    def __init__(self, keep):
+        self.buckets = deque(maxlen=keep)
+
+    def add(self, key, code, battery_v, temp):
+        if not self.buckets or self.buckets[-1]["bucket"] != key:
+            self.buckets.append({"bucket": key, "count": 0, "critical": 0, "warning": 0, "normal": 0,
+                                 "battery_min": battery_v, "battery_sum": 0.0, "temp_max": temp})
+        b = self.buckets[-1]
+        b["count"] += 1
+        b[STATUSES[code]] += 1
+        b["battery_min"] = min(b["battery_min"], battery_v)
+        b["battery_sum"] += battery_v
+        b["temp_max"] = max(b["temp_max"], temp)
+
+    def latest(self, limit):
+        if limit <= 0:
+            return []
+        out = []
+        for b in list(self.buckets)[-limit:]:
+            row = {k: v for k, v in b.items() if k != "battery_sum"}
+            row["battery_mean"] = b["battery_sum"] / b["count"]
+            out.append(row)
+        return out
+
+class HealthStats:
+    # running health counters for the live stream. The sliding window keeps the status
+    # code of its last `window` points, so adding a point is O(1): count it in, and
+    # count the evicted point out. Tumbling per-minute (by timestamp) and per-orbit
+    # (by point id) aggregates are updated on the same call.
+    def __init__(self, window=300, keep_minutes=120, keep_orbits=64, orbit_ticks=ORBIT_TICKS):
+        self.window = deque(maxlen=window)
+        self.counts = [0, 0, 0]
+        self.totals = [0, 0, 0]
+        self.orbit_ticks = orbit_ticks
+        self.minutes = _Buckets(keep_minutes)
+        self.orbits = _Buckets(keep_orbits)
+
+    def add(self, point):
+        code = int(classify(point["battery_v"], point["temp"], point["comm"], point["combined_flag"]))
+        if len(self.window) == self.window.maxlen:
+            self.counts[self.window[0]] -= 1
+        self.window.append(code)
+        self.counts[code] += 1
+        self.totals[code] += 1
+        self.minutes.add(point["timestamp"] // 60_000, code, point["battery_v"], point["temp"])
+        self.orbits.add(point["id"] // self.orbit_ticks, code, point["battery_v"], point["temp"])
+
+    def window_counts(self):
+        return dict(zip(STATUSES, self.counts))
+
+    def total_counts(self):
+        return dict(zip(STATUSES, self.totals))
+
+    def aggregates(self, kind="minute", limit=60):
+        if kind not in ("minute", "orbit"):
+            raise ValueError(f"Unknown aggregate: {kind}")
+        return (self.minutes if kind == "minute" else self.orbits).latest(limit)
@@ -0,0 +1,192 @@
+
+import bisect, threading, time
+from contextlib import contextmanager
+
+# Minimal in-process metrics (counters, gauges, fixed-bucket histograms) rendered in the
+# Prometheus text format; no client library needed. Every update is a few list/dict
+# operations under a per-metric lock, cheap enough for the per-tick hot path.
+# Label values are passed as keyword arguments: STAGE_SECONDS.observe(0.1, stage="read").
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        # plain dict of current values, for JSON stats files
+        return {m.name: m.snapshot() for m in self.metrics}
+
+REGISTRY = MetricsRegistry()
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+        self.values = {}
+        if registry is not None:
+            registry.register(self)
+
+    def snapshot(self):
+        with self.lock:
+            return {_labels_text(k) or "": v for k, v in self.values.items()}
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self.lock:
+            if not self.values:
+                return [f"{self.name} 0"]
+            return [f"{self.name}{_labels_text(k)} {_fmt(v)}" for k, v in self.values.items()]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, registry=REGISTRY, fn=None):
+        # fn: optional callable read at scrape time (e.g. a queue's qsize)
+        super().__init__(name, help, registry)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def _current(self):
+        if self.fn is not None:
+            self.set(self.fn())
+        with self.lock:
+            return dict(self.values)
+
+    def snapshot(self):
+        return {_labels_text(k) or "": v for k, v in self._current().items()}
+
+    def samples(self):
+        return [f"{self.name}{_labels_text(k)} {_fmt(v)}" for k, v in self._current().items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, registry=REGISTRY, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count, max]
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+            if value > state[3]:
+                state[3] = value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            items = [(k, list(s[0]), s[1], s[2]) for k, s in self.values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels_text(key, [('le', _fmt(le))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels_text(key)} {count}")
+        return lines
+
+    def snapshot(self):
+        with self.lock:
+            return {_labels_text(k) or "": {"count": s[2], "sum": s[1], "max": s[3]}
+                    for k, s in self.values.items()}
+
+class TimedLock:
+    # drop-in for threading.Lock in `with` statements that records how long each
+    # acquisition waited
+    def __init__(self, histogram, **labels):
+        self._lock = threading.Lock()
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        t0 = time.perf_counter()
+        self._lock.acquire()
+        self.histogram.observe(time.perf_counter() - t0, **self.labels)
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+class StageTimer:
+    # per-run stage totals (e.g. one pipeline run), mirrored into a shared histogram
+    def __init__(self, histogram=None):
+        self.histogram = histogram
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            secs = time.perf_counter() - t0
+            total, calls, longest = self.stages.get(name, (0.0, 0, 0.0))
+            self.stages[name] = (total + secs, calls + 1, max(longest, secs))
+            if self.histogram is not None:
+                self.histogram.observe(secs, stage=name)
+
+    def summary(self, rows=None):
+        elapsed = time.perf_counter() - self.started
+        out = {"seconds": round(elapsed, 4),
+               "stages": {name: {"seconds": round(t, 4), "calls": c, "max_seconds": round(m, 4)}
+                          for name, (t, c, m) in self.stages.items()}}
+        if rows is not None:
+            out["rows"] = int(rows)
+            out["rows_per_sec"] = round(rows / elapsed, 1) if elapsed > 0 else None
+        return out
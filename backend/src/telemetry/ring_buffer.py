@@ -0,0 +1,82 @@
+
+import numpy as np
+
+class TelemetryRingBuffer:
+    # preallocated column-oriented ring buffer: one NumPy array per field, a write
+    # cursor and a fill count. append is O(1) per point with no reallocation, and
+    # reading the newest n points is a slice (or two when the window wraps).
+    def __init__(self, columns, capacity=86_400, width=None):
+        # columns: {name: dtype}, in the order records are emitted. With width=N every
+        # row holds N values per column (e.g. one per satellite), stored as (capacity, N).
+        self.capacity = capacity
+        self.names = list(columns)
+        row_shape = () if width is None else (width,)
+        self.cols = {name: np.zeros((capacity,) + row_shape, dtype=dt) for name, dt in columns.items()}
+        self.head = 0   # next write position
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, point):
+        i = self.head
+        for name in self.names:
+            self.cols[name][i] = point[name]
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, columns):
+        # bulk append {name: array}; only the last `capacity` rows are kept
+        n = len(columns[self.names[0]])
+        if n == 0:
+            return
+        skip = max(0, n - self.capacity)
+        n -= skip
+        first = min(n, self.capacity - self.head)
+        for name in self.names:
+            src = np.asarray(columns[name])[skip:]
+            self.cols[name][self.head:self.head + first] = src[:first]
+            self.cols[name][:n - first] = src[first:]
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def _slices(self, n):
+        n = min(n, self.size)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return [slice(start, start + n)]
+        return [slice(start, self.capacity), slice(0, self.head)]
+
+    def latest(self, n):
+        # {name: array} of the newest n rows, oldest first. A view when the window
+        # does not wrap, so copy (e.g. under the owner's lock) before the next append.
+        parts = self._slices(n)
+        if len(parts) == 1:
+            return {name: self.cols[name][parts[0]] for name in self.names}
+        return {name: np.concatenate([self.cols[name][p] for p in parts]) for name in self.names}
+
+    def count_after(self, key, value):
+        # number of newest rows whose `key` column (increasing in arrival order) is > value
+        count = 0
+        for part in self._slices(self.size):
+            col = self.cols[key][part]
+            count += len(col) - int(np.searchsorted(col, value, side="right"))
+        return count
+
+    def snapshot(self, n):
+        # owned copy of latest(n), safe to use after releasing the lock
+        return {name: np.array(col) for name, col in self.latest(n).items()}
+
+    def snapshot_after(self, key, value, n):
+        # owned copy of the oldest n rows whose `key` column is > value, and the number
+        # of newer rows past it
+        count = self.count_after(key, value)
+        n = min(n, count)
+        return {name: np.array(col[:n]) for name, col in self.latest(count).items()}, count - n
+
+def columns_to_records(columns):
+    # bulk-convert {name: array} to a list of JSON-ready dicts; tolist() turns every
+    # column into Python scalars in one call instead of one conversion per value
+    names = list(columns)
+    lists = [columns[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*lists)]
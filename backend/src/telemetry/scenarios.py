@@ -0,0 +1,182 @@
+
+import argparse, json, os, sys
+import numpy as np
+
+# Add project root to sys.path so the module can run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.telemetry.generator import PACKET_DTYPE, PACKET_DEFAULTS, concat_packets
+
+# Seeded, vectorized scenario generator for large test captures. Rows are produced in
+# fixed blocks of BLOCK rows, each with its own SeedSequence([seed, block]) stream, so a
+# dataset depends only on its parameters, not on the chunk size it is written with.
+# Ground truth is a uint8 bitmask per row: bit i set = ANOMALY_TYPES[i] is active.
+BLOCK = 65536
+ANOMALY_TYPES = ("battery", "temp", "comm", "solar", "cpu")
+# rate: probability that an event starts at a given row; duration: rows, inclusive range;
+# magnitude: uniform range of the effect (see _apply_anomaly)
+ANOMALY_PRESETS = {
+    "battery": {"rate": 0.002, "duration": (1, 5), "magnitude": (0.5, 1.2)},    # volts dropped
+    "temp":    {"rate": 0.002, "duration": (1, 5), "magnitude": (15.0, 50.0)},  # degrees added
+    "comm":    {"rate": 0.002, "duration": (1, 5), "magnitude": (2, 2)},        # comm status
+    "solar":   {"rate": 0.001, "duration": (5, 30), "magnitude": (0.0, 0.0)},   # current forced to 0
+    "cpu":     {"rate": 0.001, "duration": (2, 10), "magnitude": (85, 100)},    # load percent
+}
+DEFAULT_ANOMALIES = {k: ANOMALY_PRESETS[k] for k in ("battery", "temp", "comm")}
+MAX_TS = 2**32 - 1   # ts is a u32 in the packet format
+
+def _base_block(rng, t):
+    # normal orbital dynamics for global tick indices t (same model as the live simulator)
+    n = len(t)
+    orbit = np.sin(2*np.pi*t/90)
+    sun = np.maximum(0, orbit)
+    z = rng.standard_normal((n, 12), dtype=np.float32)
+    cols = {"battery_v": 3.9 - 0.0002*(t % 1440) + 0.05*sun + 0.02*z[:, 0],
+            "solar_i": 0.2 + 0.15*sun + 0.02*z[:, 1],
+            "temp": 25 + 4*orbit + 0.8*z[:, 2],
+            "cpu": np.clip(20 + (5*z[:, 3]).astype(np.int64), 1, 95),
+            "comm": np.zeros(n, dtype=np.int64)}
+    for i in range(8):
+        cols[f"extra{i}"] = z[:, 4 + i]
+    return cols
+
+def _apply_anomaly(cols, kind, active, magnitude):
+    if kind == "battery":
+        cols["battery_v"] = cols["battery_v"] - np.where(active, magnitude, 0)
+    elif kind == "temp":
+        cols["temp"] = cols["temp"] + np.where(active, magnitude, 0)
+    elif kind == "comm":
+        cols["comm"] = np.where(active, 2, cols["comm"])
+    elif kind == "solar":
+        # panel / sensor dropout
+        cols["solar_i"] = np.where(active, 0.0, cols["solar_i"])
+    elif kind == "cpu":
+        cols["cpu"] = np.where(active, np.clip(magnitude, 1, 100).astype(np.int64), cols["cpu"])
+
+def _events(rng, n, spec, carry):
+    # active mask and per-row magnitude of one anomaly type over a block. An event that
+    # starts at row s lasts `duration` rows, overlapping events extend each other and the
+    # newest one sets the magnitude; carry = (rows still active, magnitude) from the
+    # previous block
+    starts = rng.random(n) < spec["rate"]
+    idx = np.flatnonzero(starts)
+    lo, hi = spec["duration"]
+    ends = idx + rng.integers(lo, hi + 1, len(idx))
+    mags = rng.uniform(*spec["magnitude"], len(idx))
+    end_at = np.full(n, -1, dtype=np.int64)
+    end_at[idx] = ends
+    # last row (exclusive) covered by any event started so far, including the carried one
+    active_until = np.maximum(np.maximum.accumulate(end_at), carry[0])
+    rows = np.arange(n)
+    active = rows < active_until
+    latest = np.maximum.accumulate(np.where(starts, rows, -1))
+    mag_at = np.zeros(n)
+    mag_at[idx] = mags
+    magnitude = np.where(latest >= 0, mag_at[np.maximum(latest, 0)], carry[1])
+    next_carry = (max(0, int(active_until[-1]) - n) if n else 0, float(magnitude[-1]) if n else carry[1])
+    return active, magnitude, next_carry
+
+def check_scenario(n, start_ts=0, sample_interval_sec=1, anomalies=DEFAULT_ANOMALIES, **_):
+    unknown = set(anomalies) - set(ANOMALY_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown anomaly types: {sorted(unknown)}")
+    if start_ts + max(0, n - 1)*sample_interval_sec > MAX_TS:
+        raise ValueError("Timestamps would overflow the packet's u32 ts; lower n, start_ts or the interval")
+
+def generate_blocks(n, seed=0, start_ts=0, sample_interval_sec=1, anomalies=DEFAULT_ANOMALIES):
+    # yields (packets, labels) per BLOCK rows; carry holds the events still open at the
+    # end of the previous block
+    check_scenario(n, start_ts, sample_interval_sec, anomalies)
+    carry = {kind: (0, 0.0) for kind in anomalies}
+    for block in range((n + BLOCK - 1) // BLOCK):
+        start = block * BLOCK
+        rows = min(BLOCK, n - start)
+        rng = np.random.default_rng(np.random.SeedSequence([seed, block]))
+        t = np.arange(start, start + rows)
+        cols = _base_block(rng, t)
+        labels = np.zeros(rows, dtype=np.uint8)
+        for kind, spec in anomalies.items():
+            active, magnitude, carry[kind] = _events(rng, rows, spec, carry[kind])
+            _apply_anomaly(cols, kind, active, magnitude)
+            labels |= active.astype(np.uint8) << ANOMALY_TYPES.index(kind)
+        packets = np.empty(rows, dtype=PACKET_DTYPE)
+        packets["ts"] = start_ts + t*sample_interval_sec
+        for name in PACKET_DTYPE.names:
+            if name in cols:
+                packets[name] = cols[name]
+            elif name != "ts":
+                packets[name] = PACKET_DEFAULTS[name]
+        yield packets, labels
+
+def generate_scenario(n, chunk_size=1_000_000, **kwargs):
+    # (packets, labels) chunks of about chunk_size rows (whole blocks)
+    per_chunk = max(1, chunk_size // BLOCK)
+    packets, labels = [], []
+    for p, l in generate_blocks(n, **kwargs):
+        packets.append(p)
+        labels.append(l)
+        if len(packets) == per_chunk:
+            yield concat_packets(packets), np.concatenate(labels)
+            packets, labels = [], []
+    if packets:
+        yield concat_packets(packets), np.concatenate(labels)
+
+def labels_path_for(path):
+    return path + ".labels"
+
+def write_scenario(path, n, labels_path=None, chunk_size=1_000_000, **kwargs):
+    # packets go straight to the .bin packet file, ground truth to a parallel uint8 file
+    check_scenario(n, **kwargs)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    labels_path = labels_path or labels_path_for(path)
+    with open(path, "wb") as f, open(labels_path, "wb") as lf:
+        for packets, labels in generate_scenario(n, chunk_size, **kwargs):
+            packets.tofile(f)
+            labels.tofile(lf)
+    return n
+
+def read_labels(path, offset=0, count=None):
+    # memory-mapped ground-truth bitmask for a capture written by write_scenario
+    return np.memmap(labels_path_for(path), dtype=np.uint8, mode="r", offset=offset,
+                     shape=(count,) if count is not None else None)
+
+def label_columns(labels):
+    # {anomaly type: bool array} from a bitmask array
+    return {kind: (labels >> i & 1).astype(bool) for i, kind in enumerate(ANOMALY_TYPES)}
+
+def parse_anomalies(types, rate=None, duration=None):
+    anomalies = {}
+    for kind in types:
+        if kind not in ANOMALY_PRESETS:
+            raise ValueError(f"Unknown anomaly type: {kind}")
+        spec = dict(ANOMALY_PRESETS[kind])
+        if rate is not None:
+            spec["rate"] = rate
+        if duration is not None:
+            spec["duration"] = duration
+        anomalies[kind] = spec
+    return anomalies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="data/scenario.bin")
+    parser.add_argument("--n", type=float, default=1e6, help="packets to generate (e.g. 1e9)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start_ts", type=int, default=1_700_000_000)
+    parser.add_argument("--interval", type=int, default=1, help="seconds between packets")
+    parser.add_argument("--types", default="battery,temp,comm", help=f"comma-separated subset of {','.join(ANOMALY_TYPES)}")
+    parser.add_argument("--rate", type=float, default=None, help="event start probability per row (all types)")
+    parser.add_argument("--duration", default=None, help="min,max rows per event (all types)")
+    parser.add_argument("--config", default=None, help="JSON {type: {rate, duration, magnitude}}; overrides --types")
+    parser.add_argument("--chunk_size", type=int, default=1_000_000)
+    args = parser.parse_args()
+    if args.config:
+        with open(args.config) as f:
+            anomalies = {k: {**v, "duration": tuple(v["duration"]), "magnitude": tuple(v["magnitude"])}
+                         for k, v in json.load(f).items()}
+    else:
+        duration = tuple(int(x) for x in args.duration.split(",")) if args.duration else None
+        anomalies = parse_anomalies([t for t in args.types.split(",") if t], args.rate, duration)
+    n = write_scenario(args.output, int(args.n), chunk_size=args.chunk_size, seed=args.seed, start_ts=args.start_ts,
+                       sample_interval_sec=args.interval, anomalies=anomalies)
+    print(f"Wrote {n} packets to {args.output} (labels: {labels_path_for(args.output)})")
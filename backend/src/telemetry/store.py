@@ -0,0 +1,151 @@
+
+import argparse, glob, json, os
+import numpy as np
+import pandas as pd
+from src.telemetry.generator import PACKET_DTYPE, PACKET_SIZE, concat_packets, df_to_packets, packets_to_df, read_packets
+
+# Packet archive rolled into one segment file per `segment_seconds` of ts, each with a
+# sparse index of (ts, packet number) for every `index_every`-th packet. A time-range
+# query only opens the overlapping segments and seeks straight to the indexed packet
+# at or before start_ts, so it costs O(window) rather than O(archive).
+# Packets are expected to arrive in ts order within a segment.
+# The layout (segment_seconds, index_every) is saved in store.json on the first write,
+# so readers opening the store with the defaults still prune segments correctly.
+INDEX_DTYPE = np.dtype([("ts", "<u8"), ("pos", "<u8")])
+META_FILE = "store.json"
+DEFAULT_LAYOUT = {"segment_seconds": 86400, "index_every": 1024}
+
+class TelemetryStore:
+    def __init__(self, root="data/store", segment_seconds=None, index_every=None):
+        # None = the layout saved with the store (or the default for a new store); an
+        # explicit value that contradicts the saved layout raises ValueError
+        self.root = root
+        self.meta_path = os.path.join(root, META_FILE)
+        requested = {"segment_seconds": segment_seconds, "index_every": index_every}
+        saved = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                saved = json.load(f)
+            for key, value in requested.items():
+                if value is not None and value != saved[key]:
+                    raise ValueError(f"{root} was written with {key}={saved[key]}, not {value}")
+        layout = saved or {key: DEFAULT_LAYOUT[key] if value is None else value for key, value in requested.items()}
+        self.segment_seconds = int(layout["segment_seconds"])
+        self.index_every = int(layout["index_every"])
+
+    def _save_meta(self):
+        if os.path.exists(self.meta_path):
+            return
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment_seconds": self.segment_seconds, "index_every": self.index_every}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _segment_path(self, seg_start):
+        return os.path.join(self.root, f"seg-{seg_start:010d}.bin")
+
+    def segments(self):
+        # sorted [(segment start ts, path)]
+        paths = sorted(glob.glob(os.path.join(self.root, "seg-*.bin")))
+        return [(int(os.path.basename(p)[4:-4]), p) for p in paths]
+
+    def append(self, data):
+        # data: DataFrame or PACKET_DTYPE array; routed to segments by ts
+        packets = df_to_packets(data) if isinstance(data, pd.DataFrame) else data
+        if len(packets) == 0:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        self._save_meta()
+        ts = packets["ts"].astype(np.int64)
+        seg_ids = ts - ts % self.segment_seconds
+        # split into runs of the same segment, keeping arrival order
+        bounds = np.flatnonzero(np.diff(seg_ids)) + 1
+        for run in np.split(np.arange(len(packets)), bounds):
+            self._append_segment(int(seg_ids[run[0]]), packets[run])
+        return len(packets)
+
+    def _append_segment(self, seg_start, packets):
+        path = self._segment_path(seg_start)
+        n0 = os.path.getsize(path) // PACKET_SIZE if os.path.exists(path) else 0
+        pos = np.arange(n0, n0 + len(packets))
+        marks = pos % self.index_every == 0
+        with open(path, "ab") as f:
+            packets.astype(PACKET_DTYPE, copy=False).tofile(f)
+        if marks.any():
+            entries = np.empty(int(marks.sum()), dtype=INDEX_DTYPE)
+            entries["ts"] = packets["ts"][marks]
+            entries["pos"] = pos[marks]
+            with open(path[:-4] + ".idx", "ab") as f:
+                entries.tofile(f)
+
+    def _read_index(self, path):
+        idx_path = path[:-4] + ".idx"
+        if not os.path.exists(idx_path):
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.fromfile(idx_path, dtype=INDEX_DTYPE)
+
+    def query_packets(self, start_ts=None, end_ts=None, limit=None):
+        # packets with start_ts <= ts <= end_ts (either bound may be None); with a limit,
+        # only the first `limit` of them, and no segment past the one that reaches it is read
+        parts = []
+        found = 0
+        for seg_start, path in self.segments():
+            if end_ts is not None and seg_start > end_ts:
+                break
+            if limit is not None and found >= limit:
+                break
+            if start_ts is not None and seg_start + self.segment_seconds <= start_ts:
+                continue
+            n = os.path.getsize(path) // PACKET_SIZE
+            index = self._read_index(path)
+            lo, hi = 0, n
+            if len(index):
+                if start_ts is not None:
+                    i = np.searchsorted(index["ts"], start_ts, side="left") - 1
+                    lo = int(index["pos"][i]) if i >= 0 else 0
+                if end_ts is not None:
+                    j = np.searchsorted(index["ts"], end_ts, side="right")
+                    hi = int(index["pos"][j]) if j < len(index) else n
+            packets = read_packets(path, offset=lo*PACKET_SIZE, count=hi - lo)
+            ts = packets["ts"]
+            keep = np.ones(len(packets), dtype=bool)
+            if start_ts is not None:
+                keep &= ts >= start_ts
+            if end_ts is not None:
+                keep &= ts <= end_ts
+            rows = np.flatnonzero(keep)
+            if limit is not None:
+                rows = rows[:limit - found]
+            parts.append(np.asarray(packets[rows]))
+            found += len(rows)
+        if not parts:
+            return np.empty(0, dtype=PACKET_DTYPE)
+        return concat_packets(parts)
+
+    def query(self, start_ts=None, end_ts=None, columns=None, limit=None):
+        return packets_to_df(self.query_packets(start_ts, end_ts, limit), columns)
+
+    def latest_ts(self):
+        segs = self.segments()
+        for _, path in reversed(segs):
+            last = read_packets(path, offset=max(0, os.path.getsize(path) // PACKET_SIZE - 1)*PACKET_SIZE, count=1)
+            if len(last):
+                return int(last["ts"][0])
+        return None
+
+    def import_bin(self, bin_path, chunk_size=1_000_000):
+        # copy a flat telemetry.bin into the store, chunk by chunk
+        n_total = os.path.getsize(bin_path) // PACKET_SIZE
+        for start in range(0, n_total, chunk_size):
+            self.append(np.asarray(read_packets(bin_path, offset=start*PACKET_SIZE, count=chunk_size)))
+        return n_total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default="data/store")
+    parser.add_argument("--import_bin", default="data/telemetry.bin")
+    parser.add_argument("--segment_seconds", type=int, default=None,
+                        help="segment width for a new store (default 86400); an existing store keeps its own")
+    args = parser.parse_args()
+    store = TelemetryStore(args.root, args.segment_seconds)
+    print("Imported", store.import_bin(args.import_bin), "packets into", args.root)
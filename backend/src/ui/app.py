@@ -5,21 +5,65 @@ import numpy as np
 import joblib
 import os
 import matplotlib.pyplot as plt
+import sys
 from datetime import datetime
 
+# Add project root to sys.path so `streamlit run src/ui/app.py` can import src.*
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from src.ai.battery_residual import LR_WINDOW, prediction_column
+from src.pipeline.output_store import read_processed, processed_ts_range, load_health_summary, flagged_path, load_feature_stats
+from src.ai.explain import EXPLAIN_TOP_K, feature_moments, moments_mean_std, explanation_frame
+from src.telemetry.store import TelemetryStore
+from src.telemetry.health import health_counts
+from src.ai.model_registry import ModelRegistry, get_detector
+from src.ui.downsample import METHODS as DOWNSAMPLE_METHODS, downsample_indices
+
 st.set_page_config(layout="wide", page_title="Hex20 Nightly Demo — Improved UI")
 
 # ---- Helpers ----
 DATA_BIN = "data/telemetry.bin"
+STORE_DIR = "data/store"
+PROCESSED_PARQUET = "data/processed.parquet"
 PROCESSED_CSV = "data/processed.csv"
 FLAGGED_CSV = "data/flagged_events.csv"
 MODEL_DIR = "model"
 
 FEATURES = ["battery_v","solar_i","temp","cpu"] + [f"extra{i}" for i in range(8)]
+# only the columns the dashboard shows are read from the processed output
+UI_COLUMNS = ["ts"] + FEATURES + ["comm","iso_flag","iso_score","lr_batt_flag","lr_batt_pred","rule_flag","combined_flag"]
+TIME_WINDOWS = {"All": None, "Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7*86400}
+CHART_POINTS = 2000   # rows drawn per chart after downsampling (anomalies come on top)
+
+def processed_path():
+    # prefer the columnar output; CSV is kept as an export / fallback
+    for path in (PROCESSED_PARQUET, PROCESSED_CSV):
+        if os.path.exists(path):
+            return path
+    return None
+
+def source_mtime(path):
+    # newest modification time of a file, or of a directory and its entries (Parquet
+    # dataset / store segments); part of every cache key so new pipeline output shows up
+    if path is None or not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    if os.path.isdir(path):
+        with os.scandir(path) as entries:
+            mtime = max([mtime] + [e.stat().st_mtime_ns for e in entries])
+    return mtime
+
+def data_source():
+    # what load_processed reads: processed output, else the raw store / packet file
+    return processed_path() or (STORE_DIR if os.path.isdir(STORE_DIR) else DATA_BIN)
+
+def load_processed(start_ts=None, end_ts=None):
+    return _load_processed(processed_path(), source_mtime(data_source()), start_ts, end_ts)
 
-def load_processed():
-    if os.path.exists(PROCESSED_CSV):
-        df = pd.read_csv(PROCESSED_CSV)
+@st.cache_data(show_spinner=False, max_entries=8)
+def _load_processed(path, mtime, start_ts=None, end_ts=None):
+    if path is not None:
+        df = read_processed(path, columns=UI_COLUMNS, start_ts=start_ts, end_ts=end_ts)
         # ensure ts is readable
         if "ts" in df.columns:
             try:
@@ -28,58 +72,113 @@ def load_processed():
                 df["ts_human"] = df["ts"]
         return df
     else:
-        # fallback to read raw bin if processed csv not found
+        # fallback to raw telemetry (time-indexed store if present) if no processed output
         try:
-            from src.telemetry.generator import read_bin
-            df = read_bin(DATA_BIN)
+            if os.path.isdir(STORE_DIR):
+                df = TelemetryStore(STORE_DIR).query(start_ts, end_ts)
+            else:
+                from src.telemetry.generator import read_bin
+                df = read_bin(DATA_BIN)
             df["ts_human"] = pd.to_datetime(df["ts"], unit="s")
             return df
         except Exception:
             return pd.DataFrame()
 
 def load_models(model_dir=MODEL_DIR):
-    iso, lr, scaler = None, None, None
-    try:
-        iso = joblib.load(os.path.join(model_dir, "isoforest.joblib"))
-    except Exception:
-        iso = None
+    # current registered version, loaded once per process and shared across reruns
     try:
-        lr = joblib.load(os.path.join(model_dir, "lr_battery.joblib"))
+        detector = get_detector(model_dir)
+        return detector.iso, detector.lr, detector.scaler
     except Exception:
-        lr = None
-    try:
-        scaler = joblib.load(os.path.join(model_dir, "scaler.joblib"))
-    except Exception:
-        scaler = None
-    return iso, lr, scaler
+        pass
+    # incomplete model folder: load whatever is there
+    loaded = {}
+    for key, path in ModelRegistry(model_dir).paths().items():
+        try:
+            loaded[key] = joblib.load(path, mmap_mode="r")
+        except Exception:
+            loaded[key] = None
+    return loaded["iso"], loaded["lr"], loaded["scaler"]
+
+def inject_demo_anomaly(frame):
+    # mark the newest row as a battery/temp/comm anomaly, for the UI demo only
+    if frame.empty:
+        return frame
+    frame = frame.copy()
+    i = frame.index[-1]
+    # chart frames only carry some of the columns
+    if "battery_v" in frame.columns:
+        frame.loc[i, "battery_v"] = frame.loc[i, "battery_v"] - 0.8
+    if "temp" in frame.columns:
+        frame.loc[i, "temp"] = frame.loc[i, "temp"] + 35
+    # Mark flags for UI demo
+    for col, value in (("comm", 2), ("rule_flag", 1), ("combined_flag", 1), ("iso_flag", 1)):
+        if col in frame.columns:
+            frame.loc[i, col] = value
+    return frame
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def chart_frame(path, mtime, start_ts, rows, metric, max_points, method):
+    # newest `rows` rows of one metric, downsampled to ~max_points plus all flagged rows;
+    # cached per source mtime so reruns (widget changes) skip both the read and the pass
+    df = _load_processed(path, mtime, start_ts)
+    view = df.tail(rows)
+    if metric == "battery_v" and "lr_batt_pred" not in view.columns:
+        # raw telemetry: predict the overlay over the contiguous rows, before downsampling
+        lr = load_models()[1]
+        if lr is not None and len(view) > LR_WINDOW:
+            view = view.assign(lr_batt_pred=prediction_column(view["battery_v"].ffill().values, lr))
+    cols = ["ts", "ts_human", metric] + [c for c in ("combined_flag", "lr_batt_pred") if c in view.columns and c != metric]
+    view = view[cols].reset_index(drop=True)
+    flagged = view["combined_flag"].fillna(0).astype(bool).values if "combined_flag" in view.columns else None
+    idx = downsample_indices(view["ts"].values, view[metric].values, max_points, method, keep=flagged)
+    return view.iloc[idx].reset_index(drop=True)
 
 def compute_health_summary(df):
-    # rule-based critical: battery < 3.2 or temp > 70 or comm==2
-    if df.empty: 
-        return {"critical":0,"warning":0,"normal":0}
-    rule = ((df["battery_v"] < 3.2) | (df["temp"] > 70) | (df["comm"]==2))
-    iso = df.get("iso_flag", pd.Series(0, index=df.index)).fillna(0).astype(int)
-    lr = df.get("lr_batt_flag", pd.Series(0, index=df.index)).fillna(0).astype(int)
-    combined = ((rule) | (iso==1) | (lr==1))
-    critical = int(rule.sum())
-    warning = int(((combined) & (~rule)).sum())
-    normal = int((~combined).sum())
-    return {"critical":critical,"warning":warning,"normal":normal}
-
-def zscore_explain(df, idx, features=FEATURES, top_k=3):
-    # compute simple z-scores using mean/std on the dataset
-    vals = {}
-    if df.empty or idx not in df.index:
-        return vals
-    feat_arr = df[features].fillna(0.0)
-    mu = feat_arr.mean()
-    sd = feat_arr.std().replace(0, 1e-6)
-    row = feat_arr.loc[idx]
-    z = ((row - mu) / sd).abs().sort_values(ascending=False)
-    top = z.head(top_k)
-    for f,score in top.items():
-        vals[f] = float(score)
-    return vals
+    # rule-based critical: battery < 3.2 or temp > 70 or comm==2; warning: model flags only
+    return health_counts(df)
+
+EXPLAIN_PREFIXES = ("dev", "attr")
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _load_explanations(path, mtime):
+    # explanation columns the pipeline wrote next to every flagged row, indexed by ts
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame()
+    flagged = read_processed(path)
+    cols = [c for c in flagged.columns if c.startswith(EXPLAIN_PREFIXES)]
+    if flagged.empty or not cols:
+        return pd.DataFrame()
+    return flagged[["ts"] + cols].drop_duplicates("ts", keep="last").set_index("ts")
+
+def _explanation_dicts(rec, top_k=EXPLAIN_TOP_K):
+    # {"deviation": {feature: z}, "attribution": {feature: share}} from one explanation row
+    out = {"deviation": {}, "attribution": {}}
+    for key, prefix, value in (("deviation", "dev", "z"), ("attribution", "attr", "share")):
+        for i in range(1, top_k + 1):
+            feature = rec.get(f"{prefix}{i}_feature")
+            if isinstance(feature, str):
+                out[key][feature] = float(rec[f"{prefix}{i}_{value}"])
+    return out
+
+def explain_row(df, row, features=FEATURES):
+    # precomputed explanation of a flagged row from the pipeline output; otherwise
+    # z-scores against the saved feature stats, or (raw data only) against df itself
+    path = processed_path()
+    if path is not None:
+        fpath = flagged_path(path)
+        table = _load_explanations(fpath, source_mtime(fpath))
+        if row["ts"] in table.index:
+            return _explanation_dicts(table.loc[row["ts"]])
+    stats = load_feature_stats(path, features) if path is not None else None
+    if stats is not None:
+        mean, std = moments_mean_std((stats["count"], stats["mean"], stats["m2"]))
+    elif not df.empty:
+        mean, std = moments_mean_std(feature_moments(df[features].fillna(0.0).to_numpy()))
+    else:
+        return _explanation_dicts({})
+    x = pd.to_numeric(row[features], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    return _explanation_dicts(explanation_frame(x[None, :], features, mean, std).iloc[0])
 
 def plot_timeseries(df, metric, anomalies_mask=None, ax=None):
     if df.empty:
@@ -103,11 +202,32 @@ st.title("Hex20 — Nightly Telemetry Test (Improved UI)")
 st.markdown("Interactive dashboard that shows telemetry, model predictions, and explanations. "
             "Use the Controls to re-run processing or trigger demo anomalies.")
 
-df = load_processed()
+time_window = st.sidebar.selectbox("Time window", list(TIME_WINDOWS), index=0)
+start_ts = None
+if TIME_WINDOWS[time_window] is not None:
+    max_ts = None
+    if processed_path() is not None:
+        _, max_ts = processed_ts_range(processed_path())
+    elif os.path.isdir(STORE_DIR):
+        max_ts = TelemetryStore(STORE_DIR).latest_ts()
+    if max_ts is not None:
+        start_ts = max_ts - TIME_WINDOWS[time_window]
+
+chart_method = st.sidebar.selectbox("Chart downsampling", DOWNSAMPLE_METHODS, index=0,
+                                    help="lttb keeps the visual shape, minmax keeps every bucket's extremes; flagged points are always drawn")
+chart_points = st.sidebar.number_input("Points per chart", min_value=200, max_value=20000, value=CHART_POINTS, step=200)
+
+df = load_processed(start_ts=start_ts)
 iso_model, lr_model, scaler = load_models()
+demo_anomaly = False
 
-# Top summary
-summary = compute_health_summary(df)
+# Top summary: the pipeline's precomputed counts cover the whole output; only a
+# narrower time window needs counting here
+summary = None
+if start_ts is None and processed_path() is not None:
+    summary = load_health_summary(processed_path())
+if summary is None:
+    summary = compute_health_summary(df)
 col_a, col_b, col_c, col_d = st.columns([2,1,1,1])
 with col_a:
     st.subheader("Telemetry overview")
@@ -132,12 +252,12 @@ with ctrl1:
         # call pipeline; requires PYTHONPATH set in environment or package installed
         try:
             # Use os.system to preserve user's environment; user must ensure PYTHONPATH or package set
-            cmd = 'python -m src.pipeline.process_pipeline --input data/telemetry.bin --output data/processed.csv --model_dir model'
+            cmd = f'python -m src.pipeline.process_pipeline --input data/telemetry.bin --output {PROCESSED_PARQUET} --model_dir model'
             st.code(cmd, language="bash")
             res = os.system(cmd)
             if res == 0:
                 st.success("Processing finished. Reloading data...")
-                df = load_processed()
+                df = load_processed(start_ts=start_ts)
             else:
                 st.error("Processing returned non-zero exit code. Check console for errors.")
         except Exception as e:
@@ -146,16 +266,8 @@ with ctrl2:
     if st.button("Inject demo anomaly (non-destructive)"):
         # Create an in-memory anomaly preview: mark last row as low battery/high temp or add sample
         st.warning("Injecting demo anomaly into view only (does not modify files).")
-        if not df.empty:
-            df = df.copy()
-            i = df.index[-1]
-            df.loc[i, "battery_v"] = df.loc[i, "battery_v"] - 0.8
-            df.loc[i, "temp"] = df.loc[i, "temp"] + 35
-            df.loc[i, "comm"] = 2
-            # Mark flags for UI demo
-            df.loc[i, "rule_flag"] = 1
-            df.loc[i, "combined_flag"] = 1
-            df.loc[i, "iso_flag"] = 1
+        demo_anomaly = True
+        df = inject_demo_anomaly(df)
 with ctrl3:
     st.write("Models available:")
     if os.path.exists(MODEL_DIR):
@@ -174,46 +286,42 @@ with left:
     if df.empty:
         st.info("No data to plot")
     else:
-        # choose window / filters
-        max_rows = st.slider("Rows to show (most recent)", min_value=100, max_value=min(5000, len(df)), value=800, step=100)
-        df_view = df.tail(max_rows).reset_index(drop=True)
+        # choose window / filters; long ranges are downsampled per chart, so the whole
+        # selection can be shown
+        max_rows = st.slider("Rows to show (most recent)", min_value=min(100, len(df)), max_value=len(df),
+                             value=min(800, len(df)), step=100 if len(df) > 100 else 1)
+        mtime = source_mtime(data_source())
 
-        # anomalies mask
-        anomalies_mask = df_view.get("combined_flag", pd.Series(0, index=df_view.index)).fillna(0).astype(int).astype(bool)
+        def chart_view(metric):
+            view = chart_frame(processed_path(), mtime, start_ts, max_rows, metric, chart_points, chart_method)
+            if demo_anomaly:
+                view = inject_demo_anomaly(view)
+            mask = view["combined_flag"].fillna(0).astype(bool) if "combined_flag" in view.columns else None
+            return view, mask
 
         # Battery plot with prediction (if LR model present)
-        fig_batt = plot_timeseries(df_view, "battery_v", anomalies_mask)
-        # overlay predicted next values if lr_model present: compute sliding windows and predict next for each valid point
-        if lr_model is not None:
-            try:
-                win = 5
-                batt_series = df_view["battery_v"].fillna(method="ffill").values
-                Xw = []
-                idxs = []
-                for i in range(len(batt_series)-win):
-                    Xw.append(batt_series[i:i+win])
-                    idxs.append(i+win)
-                if len(Xw) > 0:
-                    preds = lr_model.predict(np.array(Xw))
-                    # create a series aligned with idxs
-                    pred_series = pd.Series(index=df_view.index, dtype=float)
-                    for p_i, idx in enumerate(idxs):
-                        pred_series.at[idx] = preds[p_i]
-                    ax = fig_batt.axes[0]
-                    ax.plot(df_view["ts_human"], pred_series, linestyle="--", label="LR predicted next", alpha=0.7)
-                    ax.legend()
-            except Exception:
-                pass
+        batt_view, batt_mask = chart_view("battery_v")
+        fig_batt = plot_timeseries(batt_view, "battery_v", batt_mask)
+        # LR predicted-next overlay, precomputed by the pipeline (lr_batt_pred)
+        if "lr_batt_pred" in batt_view.columns and batt_view["lr_batt_pred"].notna().any():
+            ax = fig_batt.axes[0]
+            ax.plot(batt_view["ts_human"], batt_view["lr_batt_pred"], linestyle="--", label="LR predicted next", alpha=0.7)
+            ax.legend()
         st.pyplot(fig_batt)
+        plt.close(fig_batt)
 
         # Temp and Solar plots side by side
-        fig_temp = plot_timeseries(df_view, "temp", anomalies_mask)
-        fig_solar = plot_timeseries(df_view, "solar_i", anomalies_mask)
+        temp_view, temp_mask = chart_view("temp")
+        solar_view, solar_mask = chart_view("solar_i")
+        fig_temp = plot_timeseries(temp_view, "temp", temp_mask)
+        fig_solar = plot_timeseries(solar_view, "solar_i", solar_mask)
         cols = st.columns(2)
         with cols[0]:
             st.pyplot(fig_temp)
         with cols[1]:
             st.pyplot(fig_solar)
+        plt.close(fig_temp)
+        plt.close(fig_solar)
 
 # Right: anomalies table and explanation
 with right:
@@ -260,13 +368,16 @@ with right:
             for r in reasons:
                 st.write("•", r)
 
-            # Show iso_score and top contributing features via simple z-score
-            idx_global = table.index[sel] if (show_only_flagged and len(table)>0) else table.index[sel]
-            z = zscore_explain(df, idx_global)
-            if z:
+            # top contributing features, precomputed by the pipeline for flagged rows
+            explanation = explain_row(df, selected)
+            if explanation["deviation"]:
                 st.markdown("**Top feature deviations (z-score)**")
-                for f,s in z.items():
+                for f,s in explanation["deviation"].items():
                     st.write(f"{f}: z={s:.2f}")
+            if explanation["attribution"]:
+                st.markdown("**IsolationForest path attribution**")
+                for f,s in explanation["attribution"].items():
+                    st.write(f"{f}: {s:.0%} of isolation evidence")
 
             # Show prediction plot for this selected row: last N points + predicted next
             try:
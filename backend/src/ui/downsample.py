@@ -0,0 +1,66 @@
+
+import numpy as np
+
+# Row selection for charts: at most ~max_points rows that keep the visual shape of a
+# series, plus every row in `keep` (anomalies), so flagged points never disappear.
+# Returned indices are sorted positions into the input arrays.
+METHODS = ("lttb", "minmax")
+
+def minmax_indices(y, max_points):
+    # first/last row plus the min and max row of each of max_points/2 equal buckets
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    n_buckets = max(1, (max_points - 2) // 2)
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    buckets = padded.reshape(n_buckets, size)
+    # all-NaN tail buckets (from padding) are dropped
+    valid = ~np.isnan(buckets).all(axis=1)
+    offsets = np.arange(n_buckets)[valid] * size
+    lo = offsets + np.nanargmin(buckets[valid], axis=1)
+    hi = offsets + np.nanargmax(buckets[valid], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lo, hi]))
+
+def lttb_indices(x, y, max_points):
+    # Largest-Triangle-Three-Buckets: per bucket, the row forming the largest triangle
+    # with the previously chosen row and the mean of the next bucket
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # bucket means, used as the third triangle vertex
+    csx = np.concatenate([[0.0], np.cumsum(x)])
+    csy = np.concatenate([[0.0], np.cumsum(y)])
+    counts = np.maximum(edges[1:] - edges[:-1], 1)
+    mean_x = (csx[edges[1:]] - csx[edges[:-1]]) / counts
+    mean_y = (csy[edges[1:]] - csy[edges[:-1]]) / counts
+    out = np.empty(max_points, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 1 < len(mean_x):
+            cx, cy = mean_x[b + 1], mean_y[b + 1]
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area)) if hi > lo else lo
+        out[b + 1] = a
+    return np.unique(out)
+
+def downsample_indices(x, y, max_points=2000, method="lttb", keep=None):
+    if method == "lttb":
+        idx = lttb_indices(x, y, max_points)
+    elif method == "minmax":
+        idx = minmax_indices(y, max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    if keep is not None:
+        idx = np.union1d(idx, np.flatnonzero(np.asarray(keep, dtype=bool)))
+    return idx
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+from src.telemetry.archive import PacketArchive, archive_to_bin, bin_to_archive
+from src.telemetry.generator import read_packets
+from src.telemetry.scenarios import write_scenario
+
+def make_archive(tmp_path, n=10_000, block_size=1_000):
+    capture = str(tmp_path / "capture.bin")
+    write_scenario(capture, n, seed=5, start_ts=1_700_000_000)
+    archive = bin_to_archive(capture, str(tmp_path / "capture.tpa"), block_size=block_size, codec="zlib",
+                             chunk_size=3_000)
+    return capture, archive
+
+def test_round_trip_is_byte_exact(tmp_path):
+    capture, archive = make_archive(tmp_path)
+    restored = str(tmp_path / "restored.bin")
+    assert archive_to_bin(archive.path, restored) == 10_000
+    with open(capture, "rb") as a, open(restored, "rb") as b:
+        assert a.read() == b.read()
+
+def test_range_and_columns(tmp_path):
+    capture, archive = make_archive(tmp_path)
+    packets = np.asarray(read_packets(capture))
+    lo, hi = int(packets["ts"][2_500]), int(packets["ts"][4_200])
+    expected = packets[(packets["ts"] >= lo) & (packets["ts"] <= hi)]
+    np.testing.assert_array_equal(archive.read_packets(lo, hi), expected)
+    assert len(archive.select_blocks(lo, hi)) == 3   # blocks 2..4 of 1,000 rows
+    df = archive.read(lo, hi, columns=["ts", "temp"])
+    assert list(df.columns) == ["ts", "temp"]
+    np.testing.assert_array_equal(df["temp"].to_numpy(), expected["temp"])
+
+def test_missing_index_is_rebuilt(tmp_path):
+    capture, archive = make_archive(tmp_path)
+    index = archive.index()
+    os.remove(archive.index_path)
+    reopened = PacketArchive(archive.path)
+    np.testing.assert_array_equal(reopened.index(), index)
+    np.testing.assert_array_equal(reopened.read_packets(), np.asarray(read_packets(capture)))
+
+def test_index_behind_the_archive_is_rebuilt(tmp_path):
+    capture, archive = make_archive(tmp_path)
+    index = archive.index()
+    index[:-2].tofile(archive.index_path)   # e.g. a crash between the block and index writes
+    np.testing.assert_array_equal(PacketArchive(archive.path).index(), index)
+
+def test_append_drops_a_torn_trailing_block(tmp_path):
+    capture, archive = make_archive(tmp_path)
+    packets = np.asarray(read_packets(capture))
+    size = os.path.getsize(archive.path)
+    with open(archive.path, "ab") as f:
+        f.write(b"\0" * 50)   # partial block header from an interrupted append
+    assert os.path.getsize(archive.path) > size
+    archive.append(packets[:1_000])
+    np.testing.assert_array_equal(archive.read_packets(), np.concatenate([packets, packets[:1_000]]))
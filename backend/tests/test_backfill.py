@@ -0,0 +1,75 @@
+import os, subprocess, sys
+from src.scheduler.backfill import discover, load_status, output_for, run_backfill
+from src.scheduler.locks import acquire_lock, lock_path_for, release_lock
+from src.telemetry.scenarios import write_scenario
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "model")
+BACKEND = os.path.join(os.path.dirname(__file__), "..")
+
+def touch(path, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    os.utime(path, (mtime, mtime))
+
+def test_output_for_keeps_same_named_inputs_apart(tmp_path):
+    a = output_for("data/captures/seg-1.bin", "out")
+    assert a == output_for(os.path.abspath("data/captures/seg-1.bin"), "out")
+    assert a != output_for("data/store/seg-1.bin", "out")
+    assert os.path.basename(os.path.dirname(a)).startswith("seg-1-")
+
+def test_discover_skips_fresh_done_and_backed_off_inputs(tmp_path):
+    now = 1_000_000.0
+    for name, mtime in (("old", now - 300), ("new", now - 100), ("open", now - 5), ("done", now - 200),
+                        ("retry", now - 400)):
+        touch(str(tmp_path / f"{name}.bin"), mtime)
+    done = str(tmp_path / "done.bin")
+    status = {"jobs": {
+        os.path.abspath(done): {"status": "done", "model_version": "v1", "input_size": 0, "input_mtime": now - 200,
+                                "output": done},
+        os.path.abspath(str(tmp_path / "retry.bin")): {"status": "failed", "retry_at": now + 10}}}
+    pending = discover([str(tmp_path / "*.bin")], "out", status, "v1", min_age=60, now=now)
+    assert sorted(pending, reverse=True) == [(now - 100, str(tmp_path / "new.bin")),
+                                             (now - 300, str(tmp_path / "old.bin"))]
+    # a new model version reprocesses the finished input
+    assert (now - 200, done) in discover([str(tmp_path / "*.bin")], "out", status, "v2", min_age=60, now=now)
+
+def test_lock_is_exclusive_and_freed_when_the_holder_dies(tmp_path):
+    path = lock_path_for(str(tmp_path / "out" / "processed.parquet"))
+    lock = acquire_lock(path)
+    assert lock is not None and acquire_lock(path) is None
+    release_lock(lock)
+    code = ("import sys, time; from src.scheduler.locks import acquire_lock; "
+            f"lock = acquire_lock({path!r}); print(lock is not None, flush=True); time.sleep(60)")
+    child = subprocess.Popen([sys.executable, "-c", code], cwd=BACKEND, stdout=subprocess.PIPE, text=True)
+    try:
+        assert child.stdout.readline().strip() == "True"
+        assert acquire_lock(path) is None
+    finally:
+        child.kill()
+        child.wait()
+    lock = acquire_lock(path)
+    assert lock is not None
+    release_lock(lock)
+
+def test_run_backfill_processes_retries_and_gives_up(tmp_path):
+    capture = str(tmp_path / "in" / "capture.bin")
+    write_scenario(capture, 3_000, seed=2)
+    os.makedirs(tmp_path / "in" / "broken.bin")   # matches the glob but cannot be read
+    root = str(tmp_path / "backfill")
+    kwargs = dict(output_root=root, model_dir=MODEL_DIR, jobs=2, chunk_size=1_000, max_attempts=2,
+                  backoff=0.01, min_age=0)
+    summary = run_backfill([str(tmp_path / "in" / "*.bin")], **kwargs)
+    assert summary["jobs"] == {"done": 1, "dead": 1} and summary["rows_done"] == 3_000
+    jobs = load_status(root)["jobs"]
+    done = jobs[os.path.abspath(capture)]
+    assert os.path.exists(done["output"]) and done["attempts"] == 1
+    dead = jobs[os.path.abspath(str(tmp_path / "in" / "broken.bin"))]
+    assert dead["attempts"] == 2 and dead["error"].startswith("IsADirectoryError")
+    # nothing left to do until an input or the model changes
+    assert not discover([str(tmp_path / "in" / "*.bin")], root, load_status(root), done["model_version"], min_age=0)
+    # a second run on the same output root waits for the first
+    lock = acquire_lock(os.path.join(root, "backfill.lock"))
+    try:
+        assert run_backfill([str(tmp_path / "in" / "*.bin")], **kwargs) is None
+    finally:
+        release_lock(lock)
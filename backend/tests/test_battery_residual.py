@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from src.ai.battery_residual import (LR_WINDOW, predict_next, prediction_column, predictions_and_residuals,
+                                     residual_flags, residual_threshold, training_windows)
+
+def battery(n=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    batt = 3.9 - 0.0002*np.arange(n) + 0.02*rng.standard_normal(n)
+    batt[1_000:1_005] -= 0.5
+    return batt
+
+def fitted(batt):
+    X, y = training_windows(batt)
+    return LinearRegression().fit(X, y)
+
+def test_training_windows_match_loop():
+    batt = battery()
+    X, y = training_windows(batt)
+    Xw = [batt[i:i+LR_WINDOW] for i in range(len(batt) - LR_WINDOW - 1)]
+    yw = [batt[i+LR_WINDOW] for i in range(len(batt) - LR_WINDOW - 1)]
+    np.testing.assert_array_equal(X, np.array(Xw))
+    np.testing.assert_array_equal(y, np.array(yw))
+
+def test_predictions_match_lr_predict():
+    batt = battery()
+    lr = fitted(batt)
+    windows = np.array([batt[i:i+LR_WINDOW] for i in range(len(batt) - LR_WINDOW + 1)])
+    np.testing.assert_array_equal(predict_next(batt, lr), lr.predict(windows))
+    n = len(batt) - LR_WINDOW
+    pred, res = predictions_and_residuals(batt, lr)
+    assert len(pred) == n
+    np.testing.assert_array_equal(pred, lr.predict(windows[:n]))
+    np.testing.assert_array_equal(res, np.abs(batt[LR_WINDOW:] - pred))
+    assert len(predictions_and_residuals(batt[:LR_WINDOW], lr)[0]) == 0
+
+def test_prediction_column_aligns_with_rows():
+    # the dashboard overlay for raw telemetry (no lr_batt_pred column)
+    batt = battery()
+    lr = fitted(batt)
+    pred = prediction_column(batt, lr)
+    assert len(pred) == len(batt)
+    assert np.isnan(pred[:LR_WINDOW]).all()
+    np.testing.assert_array_equal(pred[LR_WINDOW:], predictions_and_residuals(batt, lr)[0])
+    assert np.isnan(prediction_column(batt[:LR_WINDOW], lr)).all()
+
+def test_global_flags_match_loop():
+    batt = battery()
+    _, res = predictions_and_residuals(batt, fitted(batt))
+    thresh = res.mean() + 3*res.std()
+    expected = [1 if r > thresh else 0 for r in res]
+    np.testing.assert_array_equal(residual_flags(res), expected)
+    assert residual_flags(res)[1_000 - LR_WINDOW:1_005 - LR_WINDOW].any()
+
+def test_rolling_and_robust_thresholds():
+    res = np.abs(np.random.default_rng(1).standard_normal(500))
+    rolling = residual_threshold(res, "rolling", window=50)
+    r = pd.Series(res).rolling(50, min_periods=2)
+    expected = (r.mean() + 3*r.std(ddof=0)).to_numpy()
+    np.testing.assert_allclose(rolling[1:], expected[1:])
+    med = np.median(res)
+    assert residual_threshold(res, "robust") == pytest.approx(med + 3*1.4826*np.median(np.abs(res - med)))
+    with pytest.raises(ValueError):
+        residual_threshold(res, "nope")
@@ -0,0 +1,48 @@
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+from src.ai.compiled_forest import CompiledForest
+
+def fit(seed=0, n=2_000, n_features=12):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features)) * rng.uniform(0.01, 50, n_features) + rng.uniform(-100, 100, n_features)
+    scaler = StandardScaler().fit(X)
+    iso = IsolationForest(n_estimators=50, max_features=0.75, random_state=seed).fit(scaler.transform(X))
+    return X, scaler, iso
+
+def test_matches_sklearn_decision_function(tmp_path):
+    X, scaler, iso = fit()
+    rng = np.random.default_rng(1)
+    # training rows, fresh rows and far outliers, each scored against the same forest
+    queries = np.vstack([X[:500], rng.normal(size=(500, X.shape[1])) * X.std(0) + X.mean(0), X[:50] * 1e6])
+    expected = iso.decision_function(scaler.transform(queries))
+    compiled = CompiledForest.from_sklearn(iso, scaler)
+    np.testing.assert_array_equal(compiled.decision_function(queries), expected)
+    np.testing.assert_array_equal(compiled.decision_function(queries, batch_size=7), expected)
+    compiled.save(tmp_path / "forest.npz")
+    np.testing.assert_array_equal(CompiledForest.load(tmp_path / "forest.npz").decision_function(queries), expected)
+
+def test_without_scaler():
+    X, _, _ = fit(seed=2)
+    iso = IsolationForest(n_estimators=20, random_state=2).fit(X)
+    np.testing.assert_array_equal(CompiledForest.from_sklearn(iso).decision_function(X), iso.decision_function(X))
+
+def test_detector_rebuilds_a_stale_cache(tmp_path):
+    # the cache must follow the file contents, not mtimes: a copy with preserved (older)
+    # mtimes of another model must not be scored with the previous compile
+    import joblib, os
+    from src.ai.anomaly_detector import AnomalyDetector, compiled_cache_path
+    X, scaler, iso = fit(seed=3)
+    _, _, other = fit(seed=4)
+    forest, scaler_path = str(tmp_path / "isoforest.joblib"), str(tmp_path / "scaler.joblib")
+    joblib.dump(iso, forest)
+    joblib.dump(scaler, scaler_path)
+    first = AnomalyDetector(forest, scaler_path, lazy=True)
+    assert os.path.exists(compiled_cache_path(forest))
+    np.testing.assert_array_equal(first.compiled.decision_function(X), iso.decision_function(scaler.transform(X)))
+    joblib.dump(other, forest)
+    os.utime(forest, (0, 0))
+    second = AnomalyDetector(forest, scaler_path, lazy=True)
+    np.testing.assert_array_equal(second.compiled.decision_function(X), other.decision_function(scaler.transform(X)))
+    # and an unchanged model is served from the refreshed cache
+    assert AnomalyDetector(forest, scaler_path, lazy=True).compiled.sources == second.compiled.sources
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from src.api.encoding import ARROW, JSON, MSGPACK, STRUCT, encode_columns, negotiate
+
+AVAILABLE = [JSON, ARROW, STRUCT]
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("*/*", JSON),
+    (ARROW, ARROW),
+    (f"{JSON};q=0.5, {ARROW}", ARROW),
+    (f"{ARROW};q=0.2, application/*;q=0.8", JSON),   # application/* covers JSON at a higher q
+    (f"{MSGPACK}, {STRUCT};q=0.1", STRUCT),           # msgpack not available here
+    ("text/html", None),
+    (f"{JSON};q=0", None),
+    (f"{JSON};q=bad, {STRUCT}", STRUCT),
+])
+def test_negotiate(accept, expected):
+    assert negotiate(accept, AVAILABLE) == expected
+
+def test_struct_records():
+    cols = {"id": np.arange(3, dtype=np.int64), "temp": np.array([1.5, 2.5, 3.5])}
+    body, headers = encode_columns(cols, STRUCT)
+    assert headers["X-Record-Format"] == "id:<i8,temp:<f8"
+    records = np.frombuffer(body, dtype=[("id", "<i8"), ("temp", "<f8")])
+    np.testing.assert_array_equal(records["temp"], cols["temp"])
+
+@pytest.fixture(scope="module")
+def client():
+    # the app without its lifespan: no tick loop, so the buffer only changes when a test adds points
+    from fastapi.testclient import TestClient
+    from src.api.server import app, simulator
+    simulator.backfill(50)
+    return TestClient(app)
+
+def test_telemetry_etag(client):
+    from src.api.server import simulator
+    first = client.get("/telemetry?n=20")
+    assert first.status_code == 200 and len(first.json()) == 20
+    etag = first.headers["ETag"]
+    cached = client.get("/telemetry?n=20", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["ETag"] == etag and cached.content == b""
+    # another encoding or new points change the tag
+    assert client.get("/telemetry?n=20&format=struct", headers={"If-None-Match": etag}).status_code == 200
+    simulator.backfill(1)
+    assert client.get("/telemetry?n=20", headers={"If-None-Match": etag}).status_code == 200
+
+def test_telemetry_negotiation(client):
+    assert client.get("/telemetry", headers={"Accept": "text/html"}).status_code == 406
+    res = client.get("/telemetry?n=5", headers={"Accept": STRUCT})
+    assert res.headers["content-type"] == STRUCT
+    assert len(res.content) == 5 * np.dtype([tuple(f.split(":")) for f in res.headers["X-Record-Format"].split(",")]).itemsize
+
+def test_telemetry_etag_changes_with_the_server_run(client, monkeypatch):
+    from src.api.server import simulator
+    etag = client.get("/telemetry?n=20").headers["ETag"]
+    # a restarted server numbers its points from the same ids again
+    monkeypatch.setattr(simulator.broadcaster, "epoch", "1")
+    assert client.get("/telemetry?n=20", headers={"If-None-Match": etag}).status_code == 200
+
+def test_since_id_pages_without_gaps(client):
+    from src.api.server import simulator
+    newest = simulator.latest_id()
+    since = newest - 25
+    seen = []
+    while True:
+        res = client.get(f"/telemetry?n=10&since_id={since}")
+        ids = [p["id"] for p in res.json()]
+        seen += ids
+        since = int(res.headers["X-Last-Id"])
+        if res.headers["X-More"] == "0":
+            break
+        assert len(ids) == 10
+    assert seen == list(range(newest - 24, newest + 1))
+    assert since == newest
+    res = client.get(f"/telemetry?n=10&since_id={newest}")
+    assert res.json() == [] and res.headers["X-Last-Id"] == str(newest)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from src.telemetry.health import STATUSES, HealthStats, classify, health_counts, merge_counts
+
+def points(n=1_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"id": i, "timestamp": 1_700_000_000_000 + i*1_000,
+             "battery_v": float(3.2 + rng.normal(0.3, 0.2)), "temp": float(rng.normal(40, 15)),
+             "comm": int(rng.integers(0, 3) if rng.random() < 0.05 else 0),
+             "combined_flag": int(rng.random() < 0.1)} for i in range(n)]
+
+def status(p):
+    # the scan /stats used to do
+    if p["battery_v"] < 3.2 or p["temp"] > 70 or p["comm"] == 2:
+        return "critical"
+    return "warning" if p["combined_flag"] else "normal"
+
+def scan(pts):
+    counts = dict.fromkeys(STATUSES, 0)
+    for p in pts:
+        counts[status(p)] += 1
+    return counts
+
+def test_sliding_window_matches_rescan():
+    stats = HealthStats(window=300)
+    pts = points()
+    for i, p in enumerate(pts):
+        stats.add(p)
+        if i % 97 == 0 or i == len(pts) - 1:
+            assert stats.window_counts() == scan(pts[max(0, i - 299):i + 1])
+    assert stats.total_counts() == scan(pts)
+
+def test_tumbling_aggregates():
+    stats = HealthStats(window=300, keep_minutes=5, orbit_ticks=90)
+    pts = points()
+    for p in pts:
+        stats.add(p)
+    minutes = stats.aggregates("minute", 60)
+    assert len(minutes) == 5
+    last = [p for p in pts if p["timestamp"] // 60_000 == minutes[-1]["bucket"]]
+    assert minutes[-1]["count"] == len(last)
+    assert {k: minutes[-1][k] for k in STATUSES} == scan(last)
+    assert minutes[-1]["battery_min"] == min(p["battery_v"] for p in last)
+    assert minutes[-1]["temp_max"] == max(p["temp"] for p in last)
+    orbits = stats.aggregates("orbit", 2)
+    assert [o["bucket"] for o in orbits] == [10, 11]
+    assert sum(o["count"] for o in stats.aggregates("orbit", 100)) == len(pts)
+    assert stats.aggregates("minute", 0) == [] and stats.aggregates("minute", -1) == []
+
+def test_health_counts_of_a_frame():
+    pts = points(500, seed=1)
+    df = pd.DataFrame(pts)
+    assert health_counts(df) == scan(pts)
+    assert merge_counts(health_counts(df[:200]), health_counts(df[200:])) == scan(pts)
+    assert list(classify([3.0, 3.5, 3.5], [20, 20, 20], [0, 0, 0], [0, 1, 0])) == [0, 1, 2]
@@ -0,0 +1,69 @@
+import json
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import StandardScaler
+from src.ai.model_registry import FEATURES, LEGACY_VERSION, MODEL_FILES, ModelRegistry, ModelWatcher, get_detector
+
+def write_models(d, seed):
+    X = np.random.default_rng(seed).normal(size=(300, len(FEATURES)))
+    scaler = StandardScaler().fit(X)
+    models = {"iso": IsolationForest(n_estimators=10, random_state=seed).fit(scaler.transform(X)),
+              "scaler": scaler, "lr": LinearRegression().fit(X[:, :5], X[:, 5])}
+    d.mkdir(exist_ok=True)
+    files = {key: str(d / MODEL_FILES[key]) for key in models}
+    for key, model in models.items():
+        joblib.dump(model, files[key])
+    return files, X
+
+def test_flat_model_dir_is_legacy(tmp_path):
+    write_models(tmp_path, seed=0)
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.current_version() == LEGACY_VERSION
+    assert get_detector(str(tmp_path)).version == LEGACY_VERSION
+
+def test_register_activate_and_cache(tmp_path):
+    files, _ = write_models(tmp_path / "build", seed=1)
+    registry = ModelRegistry(str(tmp_path / "model"))
+    first, second = registry.register(files), registry.register(files)
+    assert first != second   # within the same second the second one gets a suffix
+    assert set(registry.manifest()["versions"]) == {first, second}
+    assert registry.current_version() == second
+    with pytest.raises(ValueError):
+        registry.register(files, version=first)
+    detector = get_detector(registry.model_dir)
+    assert detector is get_detector(registry.model_dir)    # loaded once per process
+    assert detector.version == second
+    registry.activate(first)
+    assert get_detector(registry.model_dir).version == first
+    with pytest.raises(KeyError):
+        registry.activate("missing")
+
+def test_tampered_file_and_feature_order_are_refused(tmp_path):
+    files, _ = write_models(tmp_path / "build", seed=2)
+    registry = ModelRegistry(str(tmp_path / "model"))
+    version = registry.register(files)
+    with open(registry.paths(version)["lr"], "ab") as f:
+        f.write(b"x")
+    with pytest.raises(ValueError):
+        get_detector(registry.model_dir, version)
+    shuffled = registry.register(files, features=FEATURES[::-1])
+    assert registry.features(shuffled) == FEATURES[::-1]
+    with pytest.raises(ValueError):
+        get_detector(registry.model_dir, shuffled)
+
+def test_watcher_swaps_on_new_version(tmp_path):
+    files, _ = write_models(tmp_path / "build", seed=3)
+    registry = ModelRegistry(str(tmp_path / "model"))
+    registry.register(files)
+    swapped = []
+    watcher = ModelWatcher(registry.model_dir, swapped.append)
+    watcher.version = registry.current_version()
+    assert not watcher.check()
+    files, _ = write_models(tmp_path / "build2", seed=4)
+    new = registry.register(files)
+    assert watcher.check() and swapped[-1].version == new
+    manifest = json.load(open(registry.manifest_path))
+    assert manifest["current"] == new and set(manifest["versions"][new]["sha256"]) == set(MODEL_FILES)
@@ -0,0 +1,54 @@
+import numpy as np
+from src.telemetry.ring_buffer import TelemetryRingBuffer, columns_to_records
+
+COLUMNS = {"id": np.int64, "temp": np.float64}
+
+def point(i):
+    return {"id": i, "temp": i / 10}
+
+def test_append_wraps_like_a_bounded_list():
+    buf = TelemetryRingBuffer(COLUMNS, capacity=7)
+    reference = []
+    for i in range(25):
+        buf.append(point(i))
+        reference = (reference + [point(i)])[-7:]
+        for n in (1, 3, 7, 50):
+            assert columns_to_records(buf.snapshot(n)) == reference[-n:]
+    assert len(buf) == 7
+
+def test_extend_matches_append():
+    a = TelemetryRingBuffer(COLUMNS, capacity=10)
+    b = TelemetryRingBuffer(COLUMNS, capacity=10)
+    ids = np.arange(0, 37)
+    for chunk in np.split(ids, [3, 4, 16, 30]):   # includes a chunk larger than the capacity
+        a.extend({"id": chunk, "temp": chunk / 10})
+        for i in chunk:
+            b.append(point(int(i)))
+        for name in COLUMNS:
+            np.testing.assert_array_equal(a.latest(10)[name], b.latest(10)[name])
+
+def test_count_after_across_the_wrap():
+    buf = TelemetryRingBuffer(COLUMNS, capacity=8)
+    for i in range(13):
+        buf.append(point(i))
+    assert buf.count_after("id", 4) == 8
+    assert buf.count_after("id", 9) == 3
+    assert buf.count_after("id", 12) == 0
+
+def test_fleet_width():
+    buf = TelemetryRingBuffer({"temp": np.float64}, capacity=4, width=3)
+    for i in range(6):
+        buf.append({"temp": np.full(3, i, dtype=float)})
+    assert buf.latest(2)["temp"].shape == (2, 3)
+    np.testing.assert_array_equal(buf.latest(4)["temp"][:, 0], [2, 3, 4, 5])
+
+def test_snapshot_after_returns_the_oldest_rows():
+    buf = TelemetryRingBuffer(COLUMNS, capacity=7)
+    for i in range(12):   # wrapped: holds ids 5..11
+        buf.append(point(i))
+    cols, more = buf.snapshot_after("id", 6, 3)
+    assert columns_to_records(cols) == [point(i) for i in (7, 8, 9)] and more == 2
+    cols, more = buf.snapshot_after("id", 0, 100)
+    assert columns_to_records(cols) == [point(i) for i in range(5, 12)] and more == 0
+    cols, more = buf.snapshot_after("id", 11, 3)
+    assert len(cols["id"]) == 0 and more == 0
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from src.telemetry.scenarios import (BLOCK, ANOMALY_TYPES, DEFAULT_ANOMALIES, generate_scenario, write_scenario,
+                                     read_labels, label_columns, parse_anomalies, check_scenario, MAX_TS)
+from src.telemetry.generator import PACKET_DTYPE, concat_packets
+
+N = 2*BLOCK + 1234
+
+def scenario(chunk_size, **kwargs):
+    chunks = list(generate_scenario(N, chunk_size=chunk_size, **kwargs))
+    return concat_packets([p for p, _ in chunks]), np.concatenate([l for _, l in chunks])
+
+def test_same_seed_same_data_any_chunk_size():
+    packets, labels = scenario(10**9, seed=3)
+    for chunk_size in (1, BLOCK, 2*BLOCK):
+        p, l = scenario(chunk_size, seed=3)
+        assert p.tobytes() == packets.tobytes()
+        np.testing.assert_array_equal(l, labels)
+    other, _ = scenario(10**9, seed=4)
+    assert other.tobytes() != packets.tobytes()
+
+def test_write_scenario_labels_match(tmp_path):
+    path = str(tmp_path / "s.bin")
+    kwargs = dict(seed=1, start_ts=100, sample_interval_sec=2)
+    assert write_scenario(path, N, chunk_size=BLOCK, **kwargs) == N
+    packets, labels = scenario(10**9, **kwargs)
+    on_disk = np.fromfile(path, dtype=PACKET_DTYPE)
+    assert on_disk.tobytes() == packets.tobytes()
+    np.testing.assert_array_equal(read_labels(path), labels)
+    np.testing.assert_array_equal(read_labels(path, offset=BLOCK, count=10), labels[BLOCK:BLOCK + 10])
+    np.testing.assert_array_equal(on_disk["ts"][:3], [100, 102, 104])
+
+def test_labels_mark_the_injected_anomalies():
+    anomalies = parse_anomalies(ANOMALY_TYPES, rate=0.01)
+    packets, labels = scenario(10**9, seed=0, anomalies=anomalies)
+    cols = label_columns(labels)
+    for kind, spec in anomalies.items():
+        # events start at about `rate` per row and last `duration` rows
+        starts = np.count_nonzero(cols[kind][1:] & ~cols[kind][:-1])
+        assert 0.5 * spec["rate"] * N < starts < 1.5 * spec["rate"] * N
+    assert (packets["comm"][cols["comm"]] == 2).all()
+    assert (packets["comm"][~cols["comm"]] == 0).all()
+    assert (packets["solar_i"][cols["solar"]] == 0).all()
+    assert (packets["cpu"][cols["cpu"]] >= 85).all()
+    assert packets["temp"][cols["temp"]].mean() > packets["temp"][~cols["temp"]].mean() + 10
+    assert packets["battery_v"][cols["battery"]].mean() < packets["battery_v"][~cols["battery"]].mean() - 0.3
+
+def test_only_requested_types_are_labelled():
+    _, labels = scenario(10**9, seed=0)
+    active = {kind for kind, col in label_columns(labels).items() if col.any()}
+    assert active == set(DEFAULT_ANOMALIES)
+    _, labels = scenario(10**9, seed=0, anomalies={})
+    assert not labels.any()
+
+def test_check_scenario():
+    with pytest.raises(ValueError):
+        check_scenario(10, anomalies={"gravity": {}})
+    with pytest.raises(ValueError):
+        check_scenario(2, start_ts=MAX_TS)
+    check_scenario(1, start_ts=MAX_TS)
+    with pytest.raises(ValueError):
+        parse_anomalies(["gravity"])
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from src.telemetry.generator import read_packets
+from src.telemetry.scenarios import write_scenario
+from src.telemetry.store import TelemetryStore
+
+def make_store(tmp_path, n=5_000, **layout):
+    capture = str(tmp_path / "capture.bin")
+    write_scenario(capture, n, seed=6, start_ts=1_700_000_000, sample_interval_sec=60)
+    store = TelemetryStore(str(tmp_path / "store"), **layout)
+    store.import_bin(capture, chunk_size=1_234)
+    return np.asarray(read_packets(capture)), store
+
+def test_range_query_matches_filter(tmp_path):
+    packets, store = make_store(tmp_path, index_every=64)
+    assert len(store.segments()) > 1
+    lo, hi = int(packets["ts"][1_000]), int(packets["ts"][3_500])
+    expected = packets[(packets["ts"] >= lo) & (packets["ts"] <= hi)]
+    np.testing.assert_array_equal(store.query_packets(lo, hi), expected)
+    np.testing.assert_array_equal(store.query_packets(lo, hi, limit=100), expected[:100])
+    np.testing.assert_array_equal(store.query_packets(), packets)
+    assert store.latest_ts() == int(packets["ts"][-1])
+
+def test_layout_is_saved_with_the_store(tmp_path):
+    packets, store = make_store(tmp_path, segment_seconds=604_800)
+    reopened = TelemetryStore(store.root)   # defaults, as the UI and /archive open it
+    assert reopened.segment_seconds == 604_800
+    lo, hi = int(packets["ts"][100]), int(packets["ts"][1_300])
+    assert len(reopened.query_packets(lo, hi)) == 1_201
+    assert TelemetryStore(store.root, segment_seconds=604_800).segment_seconds == 604_800
+    with pytest.raises(ValueError):
+        TelemetryStore(store.root, segment_seconds=86_400)
@@ -42,21 +42,48 @@ export async function fetchTelemetry(): Promise<TelemetryPoint[]> {
     const rawData = await res.json();
 
     // Map backend data to frontend interface
-    return rawData.map((d: any) => ({
-      ...d,
-      timestamp: new Date(d.timestamp || new Date()),
-      // Default missing flags to 0
-      lr_batt_flag: d.lr_batt_flag || 0,
-      rule_flag: d.rule_flag || 0,
-      iso_flag: d.iso_flag || 0,
-      combined_flag: d.combined_flag || 0
-    }));
+    return rawData.map(toTelemetryPoint);
   } catch (err) {
     console.error(err);
     return [];
   }
 }
 
+function toTelemetryPoint(d: any): TelemetryPoint {
+  return {
+    ...d,
+    timestamp: new Date(d.timestamp || new Date()),
+    // Default missing flags to 0
+    lr_batt_flag: d.lr_batt_flag || 0,
+    rule_flag: d.rule_flag || 0,
+    iso_flag: d.iso_flag || 0,
+    combined_flag: d.combined_flag || 0
+  };
+}
+
+// Push-based alternative to polling: the server sends each new point once over
+// Server-Sent Events. EventSource reconnects on its own and resumes from the last
+// received id (Last-Event-ID). Point ids restart with the server, so after a server
+// restart the stream sends a "reset" event (onReset) before the new backlog.
+// Returns a function that closes the stream.
+export function subscribeTelemetry(
+  onPoint: (point: TelemetryPoint) => void,
+  backlog: number = 300,
+  onReset?: () => void
+): () => void {
+  const source = new EventSource(`${API_URL}/telemetry/stream?backlog=${backlog}`);
+  source.addEventListener("reset", () => onReset?.());
+  source.onmessage = (event) => {
+    try {
+      onPoint(toTelemetryPoint(JSON.parse(event.data)));
+    } catch (err) {
+      console.error(err);
+    }
+  };
+  source.onerror = (err) => console.error("Telemetry stream error", err);
+  return () => source.close();
+}
+
 export async function fetchHealthSummary(): Promise<HealthSummary> {
   try {
     const res = await fetch(`${API_URL}/stats`);
@@ -10,6 +10,7 @@ import {
 } from "lucide-react";
 import {
   fetchTelemetry,
+  subscribeTelemetry,
   triggerAnomaly,
   computeHealthSummary,
   TelemetryPoint
@@ -22,27 +23,32 @@ import { ControlPanel } from "@/components/ControlPanel";
 import { Slider } from "@/components/ui/slider";
 import { format } from "date-fns";
 
+// Number of points kept for charts and the health summary
+const WINDOW = 300;
+
 const Index = () => {
   const [telemetryData, setTelemetryData] = useState<TelemetryPoint[]>([]);
   const [rowsToShow, setRowsToShow] = useState([300]);
   const [currentTime, setCurrentTime] = useState(new Date());
 
-  // Initialize data and start polling
+  // Subscribe to the telemetry stream; the server pushes the last WINDOW points, then each new one.
+  // After a server restart ids start over, so the window is cleared rather than the new points dropped
   useEffect(() => {
-    const loadData = async () => {
-      const data = await fetchTelemetry();
-      setTelemetryData(data);
+    const unsubscribe = subscribeTelemetry((point) => {
+      setTelemetryData((prev) => {
+        if (prev.length > 0 && point.id <= prev[prev.length - 1].id) return prev;
+        const next = prev.length >= WINDOW ? prev.slice(prev.length - WINDOW + 1) : prev.slice();
+        next.push(point);
+        return next;
+      });
+    }, WINDOW, () => setTelemetryData([]));
+
+    const clock = setInterval(() => setCurrentTime(new Date()), 1000);
+
+    return () => {
+      unsubscribe();
+      clearInterval(clock);
     };
-
-    loadData(); // Initial load
-
-    const interval = setInterval(async () => {
-      setCurrentTime(new Date());
-      const data = await fetchTelemetry();
-      setTelemetryData(data);
-    }, 1000);
-
-    return () => clearInterval(interval);
   }, []);
 
   // Computed values